@@ -1,20 +1,39 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
-from flask_login import LoginManager
-import os
-from dotenv import load_dotenv
-from routes.auth import User, auth_bp
-from routes.accounts import accounts_bp
-from routes.customers import customers_bp
-from routes.invoices import invoices_bp
-from routes.reports import reports_bp
-from routes.data import data_bp
+from utils.startup import startup_report
+
+with startup_report.step('import flask and extensions'):
+    from flask import Flask, jsonify
+    from flask_cors import CORS
+    from flask_login import LoginManager
+    import atexit
+    import os
+    from dotenv import load_dotenv
+
+with startup_report.step('import blueprints'):
+    from routes import accounts, customers, invoices, reports
+    from routes.auth import User, auth_bp, USERS_FILE
+    from routes.accounts import accounts_bp
+    from routes.customers import customers_bp
+    from routes.invoices import invoices_bp
+    from routes.reports import reports_bp
+    from routes.data import data_bp
+    from routes.jobs import jobs_bp
+    from utils.codec import CodecJSONProvider
+    from utils.responses import compress_response
+    from utils import admission
+    from utils import snapshot
 
 # Load environment variables
-load_dotenv()
+with startup_report.step('load_dotenv'):
+    load_dotenv()
 
 app = Flask(__name__)
 
+# Route jsonify/get_json through the shared codec (orjson when installed)
+app.json = CodecJSONProvider(app)
+
+# Compress large JSON responses for clients that accept gzip or deflate
+app.after_request(compress_response)
+
 # Session configuration
 app.config.update(
     SECRET_KEY=os.getenv('SECRET_KEY', 'dev-key-please-change-in-production'),
@@ -52,6 +71,16 @@ def load_user(user_id):
     print(f"Loaded user: {user.username if user else 'None'}")
     return user
 
+# Admission control: reports and exports/imports/backups get a few slots per
+# worker and a short queue, so they can't starve CRUD and login requests.
+# Together they hold at most 6 of serve.py's 8 default threads; serve.py trims
+# them to fit smaller pools. Override with ADMISSION_REPORTS / ADMISSION_DATA,
+# e.g. "max_concurrent=4,rate=2".
+admission.limit(reports_bp, admission.RouteClass.from_env(
+    'reports', max_concurrent=2, max_queued=2, queue_timeout=5, rate=1, burst=5))
+admission.limit(data_bp, admission.RouteClass.from_env(
+    'data', max_concurrent=1, max_queued=1, queue_timeout=10, rate=0.1, burst=5))
+
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(accounts_bp)
@@ -59,10 +88,37 @@ app.register_blueprint(customers_bp)
 app.register_blueprint(invoices_bp)
 app.register_blueprint(reports_bp)
 app.register_blueprint(data_bp)
+app.register_blueprint(jobs_bp)
+
+def warm_start():
+    """Parse the data files (or load them from the snapshot) and open the invoice
+    stores before the first request."""
+    stale = snapshot.load(
+        [accounts.get_accounts_file(), customers.CUSTOMERS_FILE, reports.CUSTOMERS_FILE, USERS_FILE],
+        [invoices.INVOICES_FILE, reports.INVOICES_FILE],
+        report=startup_report
+    )
+    if stale:
+        snapshot.save_in_background()
+    atexit.register(snapshot.save)
+
+with startup_report.step('warm start'):
+    warm_start()
+startup_report.finish()
+startup_report.print_report()
 
 @app.route('/api/health')
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/api/health/startup')
+def startup_info():
+    return jsonify(startup_report.to_dict()), 200
+
+@app.route('/api/health/admission')
+def admission_info():
+    return jsonify(admission.stats()), 200
+
 if __name__ == '__main__':
+    # Development server; see serve.py for running with several worker processes
     app.run(debug=True, port=5000) 
\ No newline at end of file
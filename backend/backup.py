@@ -0,0 +1,46 @@
+"""Create, list and restore incremental backups from the command line, e.g. from cron.
+
+    python backend/backup.py create
+    python backend/backup.py list
+    python backend/backup.py restore --at 2026-10-18T23:59
+"""
+import argparse
+import sys
+
+from utils import codec
+from utils.backups import backup_store, summary
+from routes.data import create_backup, find_backup, restore_backup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incremental backups of the Accounted data files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('create', help='back up whatever changed since the last backup')
+    commands.add_parser('list', help='list backups, oldest first')
+    restore = commands.add_parser('restore', help='restore a backup (default: the latest)')
+    restore.add_argument('--id', help='backup id')
+    restore.add_argument('--at', help='restore the state as of this ISO date/time')
+    args = parser.parse_args(argv)
+
+    if args.command == 'create':
+        print(codec.dumps(summary(create_backup()), pretty=True).decode('utf-8'))
+    elif args.command == 'list':
+        for manifest in backup_store.list():
+            stats = manifest['stats']
+            print(f"{manifest['id']}  {manifest['created_at']}  "
+                  f"{stats['new_chunks']}/{stats['chunks']} new chunks  {stats['new_bytes']} bytes written")
+    else:
+        try:
+            manifest = find_backup({'id': args.id, 'at': args.at})
+        except ValueError:
+            parser.error(f'invalid --at value: {args.at}')
+        if manifest is None:
+            print('Backup not found')
+            return 1
+        restore_backup(manifest)
+        print(f"Restored backup {manifest['id']} ({manifest['created_at']})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Compare a full backup with incremental ones after a day's worth of changes.
+
+Invoices live in an InvoiceStore, as in the app, so incremental backups only
+read the lines appended since the previous backup.
+
+Usage: python backend/benchmarks/bench_backups.py [invoice count] [changed invoices]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_codec import make_dataset
+from utils import codec
+from utils.backups import BackupStore
+from utils.invoice_store import InvoiceStore
+
+
+def sources(dataset, invoice_store):
+    # Accounts and customers don't change here, so their version never does either
+    result = [(name, name, lambda records=records: (codec.dumps(r) for r in records))
+              for name, records in dataset.items()]
+    version, _ = invoice_store.version_info()
+    result.append(('invoices.json', version, invoice_store.iter_raw, invoice_store.log_view()))
+    return result
+
+
+def run(backups, dataset, invoice_store, label):
+    started = time.perf_counter()
+    manifest = backups.create(sources(dataset, invoice_store))
+    elapsed = (time.perf_counter() - started) * 1000
+    stats = manifest['stats']
+    print(f'{label:<28}{elapsed:>10.0f}{stats["new_chunks"]:>12}{stats["chunks"]:>10}{stats["new_bytes"] / 1024:>12.0f}')
+    return manifest
+
+
+def main():
+    n_invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_changes = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(2)
+    dataset = make_dataset(n_invoices)
+    invoices = dataset.pop('invoices.json')
+
+    with tempfile.TemporaryDirectory() as root:
+        backups = BackupStore(os.path.join(root, 'backups'))
+        invoice_store = InvoiceStore(os.path.join(root, 'invoices.ndjson')).open()
+        invoice_store.replace_all(invoices)
+        print(f'{n_invoices} invoices, {n_changes} changed per day')
+        print(f'{"backup":<28}{"ms":>10}{"new chunks":>12}{"chunks":>10}{"KiB written":>12}')
+        first = run(backups, dataset, invoice_store, 'full (first)')
+        for day in range(1, 4):
+            # A day's work: some invoices get paid, a few are deleted, new ones are added
+            for invoice_id in rng.sample(list(invoice_store.offsets), n_changes):
+                invoice = invoice_store.get(invoice_id)
+                invoice['status'] = 'paid'
+                invoice['payment_date'] = f'2025-12-{day:02d}'
+                invoice_store.put(invoice)
+            for invoice_id in rng.sample(list(invoice_store.offsets), n_changes // 10):
+                invoice_store.delete(invoice_id)
+            for invoice in make_dataset(n_changes, seed=day)['invoices.json']:
+                invoice['id'] = invoice_store.next_id()
+                invoice_store.put(invoice)
+            run(backups, dataset, invoice_store, f'incremental (day {day})')
+
+        started = time.perf_counter()
+        restored = backups.read_file(first, 'invoices.json')
+        print(f'restore first backup: {len(restored)} invoices in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
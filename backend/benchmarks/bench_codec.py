@@ -0,0 +1,94 @@
+"""Compare JSON codecs on the record shapes stored in data/*.json.
+
+Usage: python backend/benchmarks/bench_codec.py [invoice count]
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import codec
+
+
+def make_dataset(n_invoices, seed=1):
+    rng = random.Random(seed)
+    n_customers = max(1, n_invoices // 20)
+    customers = [{
+        'id': str(i),
+        'first_name': f'First{i}',
+        'last_name': f'Last{i}',
+        'company': f'Company {i % 97}',
+        'mobile': f'+1-555-{i:07d}',
+        'address': f'{i} Main Street, Springfield',
+        'credit_cards': [],
+        'bank_accounts': [f'DE{rng.randrange(10**18):018d}']
+    } for i in range(1, n_customers + 1)]
+    accounts = [{
+        'id': str(i),
+        'name': f'Account {i}',
+        'type': rng.choice(['bank', 'cash', 'credit card']),
+        'number': f'{rng.randrange(10**10):010d}',
+        'zone': 'EU'
+    } for i in range(1, 21)]
+    invoices = []
+    for i in range(1, n_invoices + 1):
+        items = [{
+            'description': f'Item {rng.randrange(1000)}',
+            'quantity': rng.randint(1, 10),
+            'unit_price': round(rng.uniform(1, 500), 2)
+        } for _ in range(rng.randint(1, 6))]
+        subtotal = sum(item['quantity'] * item['unit_price'] for item in items)
+        invoices.append({
+            'id': str(i),
+            'date': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'customer_id': str(rng.randint(1, n_customers)),
+            'items': items,
+            'subtotal': subtotal,
+            'tax_rate': 0.1,
+            'tax_amount': subtotal * 0.1,
+            'total': subtotal * 1.1,
+            'status': rng.choice(['pending', 'paid', 'paid', 'overdue']),
+            'payment_date': None,
+            'payment_info': None
+        })
+    return {'accounts.json': accounts, 'customers.json': customers, 'invoices.json': invoices}
+
+
+def stdlib_codecs():
+    return {
+        'json indent=2 (old)': (
+            lambda o: json.dumps(o, indent=2).encode('utf-8'),
+            lambda b: json.loads(b.decode('utf-8'))
+        ),
+        'json compact': (
+            lambda o: codec._compact_encoder.encode(o).encode('utf-8'),
+            lambda b: codec._decoder.decode(b.decode('utf-8'))
+        )
+    }
+
+
+def main():
+    n_invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dataset = make_dataset(n_invoices)
+    codecs = stdlib_codecs()
+    if codec.orjson is not None:
+        codecs['orjson'] = (codec.orjson.dumps, codec.orjson.loads)
+    else:
+        print('orjson not installed, skipping it')
+
+    print(f'{n_invoices} invoices, codec backend in use: {codec.BACKEND}')
+    print(f'{"codec":<22}{"size KiB":>10}{"dump ms":>10}{"load ms":>10}')
+    for name, (dump, load) in codecs.items():
+        data = dump(dataset)
+        assert load(data) == dataset
+        repeat = 5
+        dump_ms = min(timeit.repeat(lambda: dump(dataset), number=1, repeat=repeat)) * 1000
+        load_ms = min(timeit.repeat(lambda: load(data), number=1, repeat=repeat)) * 1000
+        print(f'{name:<22}{len(data) / 1024:>10.0f}{dump_ms:>10.1f}{load_ms:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
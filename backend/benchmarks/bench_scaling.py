@@ -0,0 +1,111 @@
+"""Measure request throughput of serve.py for different worker counts.
+
+Starts the server against the current data directory once per worker count
+and hammers a few read endpoints from several client processes. Reports are
+left out: their admission limits would turn most of these requests into 429s.
+
+Usage: python backend/benchmarks/bench_scaling.py [seconds] [worker counts, e.g. 1,2,4]
+"""
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+THREADS = 8
+CLIENTS = 16
+PATHS = ['/api/health', '/api/accounts', '/api/customers']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, workers):
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', '--port', str(port), '--workers', str(workers), '--threads', str(THREADS)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('server did not start')
+
+
+def login(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    body = json.dumps({'username': 'admin', 'password': 'admin123'})
+    conn.request('POST', '/api/auth/login', body, {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f'login failed with status {response.status}')
+    cookies = [header.split(';', 1)[0] for name, header in response.getheaders() if name.lower() == 'set-cookie']
+    return '; '.join(cookies)
+
+
+def client(args):
+    port, cookie, seconds = args
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Cookie': cookie}
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            conn.request('GET', PATHS[done % len(PATHS)], headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+        done += 1
+    return done, errors
+
+
+def measure(workers, seconds):
+    port = free_port()
+    server = start_server(port, workers)
+    try:
+        cookie = login(port)
+        with multiprocessing.Pool(CLIENTS) as pool:
+            results = pool.map(client, [(port, cookie, seconds)] * CLIENTS)
+    finally:
+        server.terminate()
+        server.wait()
+    done = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return done / seconds, errors
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    worker_counts = [int(n) for n in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 2, 4]
+
+    print(f'{os.cpu_count()} CPUs, {CLIENTS} client processes, {THREADS} threads per worker, {seconds:g}s per run')
+    print(f'{"workers":>8}{"req/s":>10}{"speedup":>10}{"errors":>8}')
+    baseline = None
+    for workers in worker_counts:
+        rate, errors = measure(workers, seconds)
+        baseline = baseline or rate
+        print(f'{workers:>8}{rate:>10.0f}{rate / baseline:>10.2f}{errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+from models.money import to_cents, from_cents, multiply_cents
+from models.records import Account, Customer, Invoice, InvoiceItem
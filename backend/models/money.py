@@ -0,0 +1,42 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Money is held as integer minor units (cents) and only turned back into
+# decimal amounts at the JSON boundary.
+CENTS = 100
+
+
+def to_cents(amount, default=None):
+    """Convert a JSON amount (int, float or numeric string) to integer cents.
+
+    A missing (None) amount is an error unless a default, in cents, is given.
+    """
+    if amount is None:
+        if default is None:
+            raise ValueError('Amount is required')
+        return default
+    if isinstance(amount, bool):
+        raise TypeError('Amount must be a number')
+    if isinstance(amount, int):
+        return amount * CENTS
+    if isinstance(amount, float):
+        # Most values are already whole cents; only fall back to Decimal for the rest
+        scaled = amount * CENTS
+        rounded = round(scaled)
+        if abs(scaled - rounded) < 1e-6:
+            return int(rounded)
+    try:
+        return int((Decimal(str(amount)) * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {amount!r}')
+
+
+def from_cents(cents):
+    """Convert integer cents back to a JSON amount."""
+    return cents / CENTS
+
+
+def multiply_cents(cents, factor):
+    """cents * factor (a quantity or rate), rounded half up to whole cents."""
+    if isinstance(factor, int) and not isinstance(factor, bool):
+        return cents * factor
+    return int((Decimal(cents) * Decimal(str(factor))).quantize(Decimal(1), rounding=ROUND_HALF_UP))
@@ -0,0 +1,189 @@
+from models.money import to_cents, from_cents, multiply_cents
+
+# Records use __slots__ rather than per-instance dicts, which matters when
+# reports hold every invoice and item in memory. Keys we don't model are kept
+# in ``extra`` so they survive a load/save round trip.
+
+
+class Account:
+    __slots__ = ('id', 'name', 'type', 'number', 'zone', 'extra')
+
+    KEYS = frozenset(__slots__) - {'extra'}
+
+    def __init__(self, id, name, type, number, zone, extra=None):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.number = number
+        self.zone = zone
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('id'), data.get('name'), data.get('type'), data.get('number'), data.get('zone'),
+            _extra(data, cls.KEYS)
+        )
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'name': self.name,
+            'type': self.type,
+            'number': self.number,
+            'zone': self.zone
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class Customer:
+    __slots__ = ('id', 'first_name', 'last_name', 'company', 'mobile', 'address',
+                 'credit_cards', 'bank_accounts', 'extra')
+
+    KEYS = frozenset(__slots__) - {'extra'}
+
+    def __init__(self, id, first_name, last_name, company='', mobile='', address='',
+                 credit_cards=None, bank_accounts=None, extra=None):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.company = company
+        self.mobile = mobile
+        self.address = address
+        self.credit_cards = credit_cards if credit_cards is not None else []
+        self.bank_accounts = bank_accounts if bank_accounts is not None else []
+        self.extra = extra
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('id'), data.get('first_name'), data.get('last_name'),
+            data.get('company', ''), data.get('mobile', ''), data.get('address', ''),
+            data.get('credit_cards', []), data.get('bank_accounts', []),
+            _extra(data, cls.KEYS)
+        )
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'company': self.company,
+            'mobile': self.mobile,
+            'address': self.address,
+            'credit_cards': self.credit_cards,
+            'bank_accounts': self.bank_accounts
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class InvoiceItem:
+    """One invoice line; unit_price and amount are in cents."""
+
+    __slots__ = ('description', 'quantity', 'unit_price', 'amount', 'extra')
+
+    KEYS = frozenset(__slots__) - {'extra'}
+
+    def __init__(self, description, quantity, unit_price, extra=None):
+        self.description = description
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.amount = multiply_cents(unit_price, quantity)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        # 'amount' is derived, so a stored or client-sent value is ignored
+        return cls(
+            data.get('description', ''), data['quantity'], to_cents(data['unit_price']),
+            _extra(data, cls.KEYS)
+        )
+
+    def to_dict(self):
+        data = {
+            'description': self.description,
+            'quantity': self.quantity,
+            'unit_price': from_cents(self.unit_price),
+            'amount': from_cents(self.amount)
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class Invoice:
+    """A sales invoice; subtotal, tax_amount and total are in cents."""
+
+    __slots__ = ('id', 'date', 'customer_id', 'items', 'subtotal', 'tax_rate', 'tax_amount',
+                 'total', 'status', 'payment_date', 'payment_info', 'extra')
+
+    KEYS = frozenset(__slots__) - {'extra'}
+
+    DEFAULT_TAX_RATE = 0.1
+
+    def __init__(self, id, date, customer_id, items, tax_rate=DEFAULT_TAX_RATE, status='pending',
+                 payment_date=None, payment_info=None, subtotal=0, tax_amount=0, total=0, extra=None):
+        self.id = id
+        self.date = date
+        self.customer_id = customer_id
+        self.items = items
+        self.subtotal = subtotal
+        self.tax_rate = tax_rate
+        self.tax_amount = tax_amount
+        self.total = total
+        self.status = status
+        self.payment_date = payment_date
+        self.payment_info = payment_info
+        self.extra = extra
+
+    def recalculate(self):
+        """Recompute subtotal, tax and total from the items, exactly, in cents."""
+        self.subtotal = sum(item.amount for item in self.items)
+        self.tax_amount = multiply_cents(self.subtotal, self.tax_rate)
+        self.total = self.subtotal + self.tax_amount
+        return self
+
+    @classmethod
+    def from_dict(cls, data, with_items=True):
+        """Build from stored JSON. with_items=False skips the line items, for
+        read-only uses such as reports that only need the totals."""
+        items = [InvoiceItem.from_dict(item) for item in data.get('items', ())] if with_items else []
+        return cls(
+            data.get('id'), data.get('date'), data.get('customer_id'), items,
+            data.get('tax_rate', cls.DEFAULT_TAX_RATE), data.get('status', 'pending'),
+            data.get('payment_date'), data.get('payment_info'),
+            to_cents(data.get('subtotal'), 0), to_cents(data.get('tax_amount'), 0), to_cents(data.get('total'), 0),
+            _extra(data, cls.KEYS)
+        )
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'date': self.date,
+            'customer_id': self.customer_id,
+            'items': [item.to_dict() for item in self.items],
+            'subtotal': from_cents(self.subtotal),
+            'tax_rate': self.tax_rate,
+            'tax_amount': from_cents(self.tax_amount),
+            'total': from_cents(self.total),
+            'status': self.status,
+            'payment_date': self.payment_date,
+            'payment_info': self.payment_info
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+def _extra(data, keys):
+    if data.keys() <= keys:
+        return None
+    return {key: value for key, value in data.items() if key not in keys}
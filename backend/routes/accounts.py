@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required
-import json
+from utils import codec, store, responses
+from models import Account
 import os
 
 accounts_bp = Blueprint('accounts', __name__)
@@ -11,16 +12,14 @@ def get_accounts_file():
 def ensure_accounts_file():
     os.makedirs('data', exist_ok=True)
     if not os.path.exists(get_accounts_file()):
-        with open(get_accounts_file(), 'w') as f:
-            json.dump([], f)
+        codec.dump_file([], get_accounts_file())
 
 @accounts_bp.route('/api/accounts', methods=['GET'])
 @login_required
 def get_accounts():
     ensure_accounts_file()
-    with open(get_accounts_file(), 'r') as f:
-        accounts = json.load(f)
-    return jsonify(accounts)
+    accounts, version, mtime_ns = store.read_versioned(get_accounts_file())
+    return responses.collection_response('accounts', version, mtime_ns, lambda pretty: codec.dumps(accounts, pretty))
 
 @accounts_bp.route('/api/accounts', methods=['POST'])
 @login_required
@@ -34,25 +33,18 @@ def create_account():
         return jsonify({'error': 'Missing required fields'}), 400
     
     # Generate a unique ID
-    with open(get_accounts_file(), 'r') as f:
-        accounts = json.load(f)
+    with store.locked(get_accounts_file()):
+        accounts = codec.load_file(get_accounts_file())
         new_id = str(len(accounts) + 1)
     
-    # Create new account
-    new_account = {
-        'id': new_id,
-        'name': data['name'],
-        'type': data['type'],
-        'number': data['number'],
-        'zone': data['zone']
-    }
+        # Create new account
+        new_account = Account(new_id, data['name'], data['type'], data['number'], data['zone']).to_dict()
     
-    # Save to file
-    accounts.append(new_account)
-    with open(get_accounts_file(), 'w') as f:
-        json.dump(accounts, f, indent=2)
+        # Save to file
+        accounts.append(new_account)
+        store.write(get_accounts_file(), accounts)
     
-    return jsonify(new_account), 201
+        return jsonify(new_account), 201
 
 @accounts_bp.route('/api/accounts/<account_id>', methods=['PUT'])
 @login_required
@@ -60,42 +52,40 @@ def update_account(account_id):
     ensure_accounts_file()
     data = request.get_json()
     
-    with open(get_accounts_file(), 'r') as f:
-        accounts = json.load(f)
+    with store.locked(get_accounts_file()):
+        accounts = codec.load_file(get_accounts_file())
     
-    # Find and update account
-    for account in accounts:
-        if account['id'] == account_id:
-            account.update({
-                'name': data.get('name', account['name']),
-                'type': data.get('type', account['type']),
-                'number': data.get('number', account['number']),
-                'zone': data.get('zone', account['zone'])
-            })
+        # Find and update account
+        for account in accounts:
+            if account['id'] == account_id:
+                account.update({
+                    'name': data.get('name', account['name']),
+                    'type': data.get('type', account['type']),
+                    'number': data.get('number', account['number']),
+                    'zone': data.get('zone', account['zone'])
+                })
             
-            with open(get_accounts_file(), 'w') as f:
-                json.dump(accounts, f, indent=2)
+                store.write(get_accounts_file(), accounts)
             
-            return jsonify(account)
+                return jsonify(account)
     
-    return jsonify({'error': 'Account not found'}), 404
+        return jsonify({'error': 'Account not found'}), 404
 
 @accounts_bp.route('/api/accounts/<account_id>', methods=['DELETE'])
 @login_required
 def delete_account(account_id):
     ensure_accounts_file()
     
-    with open(get_accounts_file(), 'r') as f:
-        accounts = json.load(f)
+    with store.locked(get_accounts_file()):
+        accounts = codec.load_file(get_accounts_file())
     
-    # Find and remove account
-    for i, account in enumerate(accounts):
-        if account['id'] == account_id:
-            accounts.pop(i)
+        # Find and remove account
+        for i, account in enumerate(accounts):
+            if account['id'] == account_id:
+                accounts.pop(i)
             
-            with open(get_accounts_file(), 'w') as f:
-                json.dump(accounts, f, indent=2)
+                store.write(get_accounts_file(), accounts)
             
-            return jsonify({'message': 'Account deleted successfully'})
+                return jsonify({'message': 'Account deleted successfully'})
     
-    return jsonify({'error': 'Account not found'}), 404 
\ No newline at end of file
+        return jsonify({'error': 'Account not found'}), 404 
\ No newline at end of file
@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, request, session
 from flask_login import login_user, logout_user, login_required, current_user, UserMixin
-import json
+from utils import codec, store
 import os
 from datetime import datetime
 
@@ -13,12 +13,11 @@ USERS_FILE = os.path.join(DATA_DIR, 'users.json')
 def ensure_users_file():
     os.makedirs(DATA_DIR, exist_ok=True)
     if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump([{
-                'id': '1',
-                'username': 'admin',
-                'password': 'admin123'
-            }], f, ensure_ascii=False)
+        codec.dump_file([{
+            'id': '1',
+            'username': 'admin',
+            'password': 'admin123'
+        }], USERS_FILE)
 
 class User(UserMixin):
     def __init__(self, id, username, password):
@@ -33,11 +32,10 @@ class User(UserMixin):
     def get(user_id):
         try:
             ensure_users_file()
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                users = json.load(f)
-                user_data = next((u for u in users if str(u['id']) == str(user_id)), None)
-                if user_data:
-                    return User(user_data['id'], user_data['username'], user_data['password'])
+            users = store.read(USERS_FILE)
+            user_data = next((u for u in users if str(u['id']) == str(user_id)), None)
+            if user_data:
+                return User(user_data['id'], user_data['username'], user_data['password'])
         except Exception as e:
             print(f"Error in get user: {str(e)}")
             return None
@@ -47,11 +45,10 @@ class User(UserMixin):
     def get_by_username(username):
         try:
             ensure_users_file()
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                users = json.load(f)
-                user_data = next((u for u in users if u['username'] == username), None)
-                if user_data:
-                    return User(user_data['id'], user_data['username'], user_data['password'])
+            users = store.read(USERS_FILE)
+            user_data = next((u for u in users if u['username'] == username), None)
+            if user_data:
+                return User(user_data['id'], user_data['username'], user_data['password'])
         except Exception as e:
             print(f"Error in get_by_username: {str(e)}")
             return None
@@ -61,9 +58,8 @@ class User(UserMixin):
 def test_users():
     try:
         ensure_users_file()
-        with open(USERS_FILE, 'r') as f:
-            users = json.load(f)
-            return jsonify(users)
+        users = store.read(USERS_FILE)
+        return jsonify(users)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
-import json
+from utils import codec, store, responses
+from models import Customer
 import os
 
 customers_bp = Blueprint('customers', __name__)
@@ -10,16 +11,14 @@ CUSTOMERS_FILE = 'data/customers.json'
 def ensure_customers_file():
     os.makedirs('data', exist_ok=True)
     if not os.path.exists(CUSTOMERS_FILE):
-        with open(CUSTOMERS_FILE, 'w') as f:
-            json.dump([], f)
+        codec.dump_file([], CUSTOMERS_FILE)
 
 @customers_bp.route('/api/customers', methods=['GET'])
 @login_required
 def get_customers():
     ensure_customers_file()
-    with open(CUSTOMERS_FILE, 'r') as f:
-        customers = json.load(f)
-    return jsonify(customers), 200
+    customers, version, mtime_ns = store.read_versioned(CUSTOMERS_FILE)
+    return responses.collection_response('customers', version, mtime_ns, lambda pretty: codec.dumps(customers, pretty))
 
 @customers_bp.route('/api/customers', methods=['POST'])
 @login_required
@@ -32,29 +31,28 @@ def create_customer():
 
     ensure_customers_file()
     
-    with open(CUSTOMERS_FILE, 'r') as f:
-        customers = json.load(f)
+    with store.locked(CUSTOMERS_FILE):
+        customers = codec.load_file(CUSTOMERS_FILE)
 
-    # Generate a simple ID (in a real app, use UUID)
-    customer_id = str(len(customers) + 1)
+        # Generate a simple ID (in a real app, use UUID)
+        customer_id = str(len(customers) + 1)
     
-    new_customer = {
-        'id': customer_id,
-        'first_name': data['first_name'],
-        'last_name': data['last_name'],
-        'company': data.get('company', ''),
-        'mobile': data.get('mobile', ''),
-        'address': data.get('address', ''),
-        'credit_cards': data.get('credit_cards', []),
-        'bank_accounts': data.get('bank_accounts', [])
-    }
+        new_customer = Customer(
+            customer_id,
+            data['first_name'],
+            data['last_name'],
+            company=data.get('company', ''),
+            mobile=data.get('mobile', ''),
+            address=data.get('address', ''),
+            credit_cards=data.get('credit_cards', []),
+            bank_accounts=data.get('bank_accounts', [])
+        ).to_dict()
     
-    customers.append(new_customer)
+        customers.append(new_customer)
     
-    with open(CUSTOMERS_FILE, 'w') as f:
-        json.dump(customers, f, indent=2)
+        store.write(CUSTOMERS_FILE, customers)
     
-    return jsonify(new_customer), 201
+        return jsonify(new_customer), 201
 
 @customers_bp.route('/api/customers/<customer_id>', methods=['PUT'])
 @login_required
@@ -63,43 +61,41 @@ def update_customer(customer_id):
     
     ensure_customers_file()
     
-    with open(CUSTOMERS_FILE, 'r') as f:
-        customers = json.load(f)
+    with store.locked(CUSTOMERS_FILE):
+        customers = codec.load_file(CUSTOMERS_FILE)
     
-    for customer in customers:
-        if customer['id'] == customer_id:
-            customer.update({
-                'first_name': data.get('first_name', customer['first_name']),
-                'last_name': data.get('last_name', customer['last_name']),
-                'company': data.get('company', customer['company']),
-                'mobile': data.get('mobile', customer['mobile']),
-                'address': data.get('address', customer['address']),
-                'credit_cards': data.get('credit_cards', customer['credit_cards']),
-                'bank_accounts': data.get('bank_accounts', customer['bank_accounts'])
-            })
+        for customer in customers:
+            if customer['id'] == customer_id:
+                customer.update({
+                    'first_name': data.get('first_name', customer['first_name']),
+                    'last_name': data.get('last_name', customer['last_name']),
+                    'company': data.get('company', customer['company']),
+                    'mobile': data.get('mobile', customer['mobile']),
+                    'address': data.get('address', customer['address']),
+                    'credit_cards': data.get('credit_cards', customer['credit_cards']),
+                    'bank_accounts': data.get('bank_accounts', customer['bank_accounts'])
+                })
             
-            with open(CUSTOMERS_FILE, 'w') as f:
-                json.dump(customers, f, indent=2)
+                store.write(CUSTOMERS_FILE, customers)
             
-            return jsonify(customer), 200
+                return jsonify(customer), 200
     
-    return jsonify({'error': 'Customer not found'}), 404
+        return jsonify({'error': 'Customer not found'}), 404
 
 @customers_bp.route('/api/customers/<customer_id>', methods=['DELETE'])
 @login_required
 def delete_customer(customer_id):
     ensure_customers_file()
     
-    with open(CUSTOMERS_FILE, 'r') as f:
-        customers = json.load(f)
+    with store.locked(CUSTOMERS_FILE):
+        customers = codec.load_file(CUSTOMERS_FILE)
     
-    for i, customer in enumerate(customers):
-        if customer['id'] == customer_id:
-            del customers[i]
+        for i, customer in enumerate(customers):
+            if customer['id'] == customer_id:
+                del customers[i]
             
-            with open(CUSTOMERS_FILE, 'w') as f:
-                json.dump(customers, f, indent=2)
+                store.write(CUSTOMERS_FILE, customers)
             
-            return jsonify({'message': 'Customer deleted successfully'}), 200
+                return jsonify({'message': 'Customer deleted successfully'}), 200
     
-    return jsonify({'error': 'Customer not found'}), 404 
\ No newline at end of file
+        return jsonify({'error': 'Customer not found'}), 404 
\ No newline at end of file
@@ -1,93 +1,227 @@
 from flask import Blueprint, jsonify, request, send_file
 from flask_login import login_required
-import json
 import os
 from datetime import datetime
 import io
 import traceback
+from utils import codec, store
+from utils.backups import backup_store, summary
+from utils.invoice_store import get_invoice_store
+from utils.jobs import job_manager, JobResult
 
 data_bp = Blueprint('data', __name__, url_prefix='/api')
 
 # Get the absolute path to the data directory
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 
+# Invoices live in their own line-per-record store but keep their usual key in backups
+INVOICES_FILE = os.path.join(DATA_DIR, 'invoices.ndjson')
+
 def ensure_data_files():
     try:
         os.makedirs(DATA_DIR, exist_ok=True)
-        data_files = ['accounts.json', 'customers.json', 'invoices.json', 'users.json']
+        data_files = ['accounts.json', 'customers.json', 'users.json']
         for file in data_files:
             file_path = os.path.join(DATA_DIR, file)
             if not os.path.exists(file_path):
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump([], f, ensure_ascii=False)
+                codec.dump_file([], file_path)
     except Exception as e:
         print(f"Error in ensure_data_files: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
         raise
 
+DATA_FILES = ['accounts.json', 'customers.json', 'invoices.json']
+
+def read_data_file(filename):
+    if filename == 'invoices.json':
+        return list(get_invoice_store(INVOICES_FILE).iter_records())
+    return store.read(os.path.join(DATA_DIR, filename))
+
+def write_data_file(filename, records):
+    if filename == 'invoices.json':
+        get_invoice_store(INVOICES_FILE).replace_all(records)
+    else:
+        store.write(os.path.join(DATA_DIR, filename), records)
+
+def build_export(job=None, pretty=False):
+    """Read all data files and return (bytes, download filename)."""
+    print(f"Starting export process...")
+    print(f"Current working directory: {os.getcwd()}")
+    print(f"Data directory path: {DATA_DIR}")
+    
+    # Ensure data directory exists
+    if not os.path.exists(DATA_DIR):
+        print(f"Creating data directory: {DATA_DIR}")
+        os.makedirs(DATA_DIR, exist_ok=True)
+    
+    ensure_data_files()
+    
+    # Create a dictionary to store all data
+    export_data = {}
+    
+    # Read all data files
+    for i, filename in enumerate(DATA_FILES):
+        if job:
+            job.set_progress(i / (len(DATA_FILES) + 1), f'Reading {filename}')
+        file_path = INVOICES_FILE if filename == 'invoices.json' else os.path.join(DATA_DIR, filename)
+        print(f"Reading file: {file_path}")
+        
+        if os.path.exists(file_path) or filename == 'invoices.json':
+            try:
+                export_data[filename] = read_data_file(filename)
+            except codec.JSONDecodeError as e:
+                print(f"Error reading {filename}: Invalid JSON format")
+                print(f"Error details: {str(e)}")
+                raise
+            except Exception as e:
+                print(f"Error reading {filename}: {str(e)}")
+                print(f"Traceback: {traceback.format_exc()}")
+                raise
+        else:
+            print(f"File not found: {file_path}")
+            export_data[filename] = []
+    
+    if job:
+        job.set_progress(len(DATA_FILES) / (len(DATA_FILES) + 1), 'Writing backup')
+    
+    # Write the combined data
+    try:
+        json_data = codec.dumps(export_data, pretty)
+    except Exception as e:
+        print(f"Error writing export data: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        raise
+    
+    # Generate a filename with timestamp
+    timestamp = datetime.now().strftime('%Y-%m-%d')
+    filename = f'accounted-backup-{timestamp}.json'
+    
+    print(f"Export successful. File size: {len(json_data)} bytes")
+    return json_data, filename
+
+def parse_import(content):
+    """Parse an uploaded backup; returns (data, error message)."""
+    try:
+        import_data = codec.loads(content)
+    except (codec.JSONDecodeError, UnicodeDecodeError):
+        return None, 'Invalid JSON file'
+    
+    # Validate the import data structure
+    if not isinstance(import_data, dict):
+        return None, 'Invalid data format'
+    return import_data, None
+
+def apply_import(import_data, job=None):
+    if job:
+        # Stopping halfway would leave some files imported and others not
+        job.prevent_cancel()
+    # Import each data file
+    for i, filename in enumerate(DATA_FILES):
+        if job:
+            job.set_progress(i / len(DATA_FILES), f'Writing {filename}')
+        if filename in import_data:
+            write_data_file(filename, import_data[filename])
+
+def read_upload():
+    """Validate the uploaded backup file; returns (bytes, error message)."""
+    if 'file' not in request.files:
+        return None, 'No file provided'
+    
+    file = request.files['file']
+    if file.filename == '':
+        return None, 'No file selected'
+    
+    if not file.filename.endswith('.json'):
+        return None, 'Invalid file format. Please upload a JSON file'
+    return file.read(), None
+
+def backup_sources():
+    """(name, version, records[, log]) for each data file, as backup_store.create expects."""
+    sources = []
+    for filename in DATA_FILES:
+        if filename == 'invoices.json':
+            invoice_store = get_invoice_store(INVOICES_FILE)
+            version, _ = invoice_store.version_info()
+            # The data file is append-only, so backups only need what was appended since the last one
+            sources.append((filename, version, invoice_store.iter_raw, invoice_store.log_view()))
+        else:
+            records, version, _ = store.read_versioned(os.path.join(DATA_DIR, filename))
+            sources.append((filename, version, lambda records=records: (codec.dumps(r) for r in records)))
+    return sources
+
+def create_backup(job=None):
+    ensure_data_files()
+    return backup_store.create(backup_sources(), job)
+
+def find_backup(params):
+    """The backup named by params['id'], or the latest one taken at or before params['at'].
+
+    Raises ValueError if params['at'] isn't an ISO date/time.
+    """
+    if params.get('id'):
+        return backup_store.get(str(params['id']))
+    if params.get('at'):
+        try:
+            at = datetime.fromisoformat(str(params['at']))
+        except ValueError:
+            raise ValueError(f"Invalid 'at' date/time: {params['at']}")
+        # Backups record naive local times; convert an explicit offset to local time
+        if at.tzinfo is not None:
+            at = at.astimezone().replace(tzinfo=None)
+        return backup_store.find(at)
+    return backup_store.latest()
+
+def restore_backup(manifest, job=None):
+    # Read (and verify) every file before writing any, so a bad chunk can't leave a partial restore
+    restored = {}
+    for i, filename in enumerate(DATA_FILES):
+        if job:
+            job.set_progress(i / (2 * len(DATA_FILES)), f'Reading {filename}')
+        if filename in manifest['files']:
+            restored[filename] = backup_store.read_file(manifest, filename)
+    if job:
+        job.prevent_cancel()
+    for i, filename in enumerate(DATA_FILES):
+        if job:
+            job.set_progress(0.5 + i / (2 * len(DATA_FILES)), f'Restoring {filename}')
+        if filename in restored:
+            write_data_file(filename, restored[filename])
+
+def run_export_job(job, params):
+    data, filename = build_export(job, bool(params.get('pretty')))
+    return JobResult(data, 'application/json; charset=utf-8', filename)
+
+def run_import_job(job, params):
+    import_data, error = parse_import(params['content'])
+    if error:
+        raise ValueError(error)
+    apply_import(import_data, job)
+    return JobResult(codec.dumps({'message': 'Data imported successfully'}))
+
+def run_backup_job(job, params):
+    return JobResult(codec.dumps(summary(create_backup(job))))
+
+def run_restore_job(job, params):
+    manifest = find_backup(params)
+    if manifest is None:
+        raise ValueError('Backup not found')
+    restore_backup(manifest, job)
+    return JobResult(codec.dumps({'message': 'Backup restored successfully', 'backup': manifest['id']}))
+
+job_manager.register('export', run_export_job)
+job_manager.register('import', run_import_job)
+job_manager.register('backup', run_backup_job)
+job_manager.register('restore', run_restore_job)
+
 @data_bp.route('/export', methods=['GET'])
 @login_required
 def export_data():
     try:
-        print(f"Starting export process...")
-        print(f"Current working directory: {os.getcwd()}")
-        print(f"Data directory path: {DATA_DIR}")
-        
-        # Ensure data directory exists
-        if not os.path.exists(DATA_DIR):
-            print(f"Creating data directory: {DATA_DIR}")
-            os.makedirs(DATA_DIR, exist_ok=True)
-        
-        ensure_data_files()
-        
-        # Create a dictionary to store all data
-        export_data = {}
-        
-        # Read all data files
-        for filename in ['accounts.json', 'customers.json', 'invoices.json']:
-            file_path = os.path.join(DATA_DIR, filename)
-            print(f"Reading file: {file_path}")
-            
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        print(f"Data in {filename}: {data}")
-                        export_data[filename] = data
-                except json.JSONDecodeError as e:
-                    print(f"Error reading {filename}: Invalid JSON format")
-                    print(f"Error details: {str(e)}")
-                    raise
-                except Exception as e:
-                    print(f"Error reading {filename}: {str(e)}")
-                    print(f"Traceback: {traceback.format_exc()}")
-                    raise
-            else:
-                print(f"File not found: {file_path}")
-                export_data[filename] = []
-        
-        # Create a BytesIO object to store the JSON data
-        memory_file = io.BytesIO()
-        
-        # Write the combined data to the BytesIO object
-        try:
-            json_data = json.dumps(export_data, indent=2, ensure_ascii=False)
-            memory_file.write(json_data.encode('utf-8'))
-            memory_file.seek(0)
-        except Exception as e:
-            print(f"Error writing to memory file: {str(e)}")
-            print(f"Traceback: {traceback.format_exc()}")
-            raise
-        
-        # Generate a filename with timestamp
-        timestamp = datetime.now().strftime('%Y-%m-%d')
-        filename = f'accounted-backup-{timestamp}.json'
-        
-        print(f"Export successful. File size: {memory_file.getbuffer().nbytes} bytes")
+        json_data, filename = build_export(pretty=codec.wants_pretty())
         
         # Return the JSON file
         return send_file(
-            memory_file,
+            io.BytesIO(json_data),
             mimetype='application/json; charset=utf-8',
             as_attachment=True,
             download_name=filename
@@ -101,35 +235,75 @@ def export_data():
 @login_required
 def import_data():
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not file.filename.endswith('.json'):
-            return jsonify({'error': 'Invalid file format. Please upload a JSON file'}), 400
+        content, error = read_upload()
+        if error:
+            return jsonify({'error': error}), 400
         
         # Read and parse the JSON file
-        try:
-            import_data = json.loads(file.read().decode('utf-8'))
-        except json.JSONDecodeError:
-            return jsonify({'error': 'Invalid JSON file'}), 400
-        
-        # Validate the import data structure
-        if not isinstance(import_data, dict):
-            return jsonify({'error': 'Invalid data format'}), 400
+        import_data, error = parse_import(content)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Import each data file
-        for filename in ['accounts.json', 'customers.json', 'invoices.json']:
-            if filename in import_data:
-                file_path = os.path.join(DATA_DIR, filename)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(import_data[filename], f, indent=2, ensure_ascii=False)
+        apply_import(import_data)
         
         return jsonify({'message': 'Data imported successfully'}), 200
     except Exception as e:
         print(f"Error in import_data: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
-        return jsonify({'error': f'Failed to import data: {str(e)}'}), 500 
\ No newline at end of file
+        return jsonify({'error': f'Failed to import data: {str(e)}'}), 500
+
+@data_bp.route('/backups', methods=['GET'])
+@login_required
+def list_backups():
+    return jsonify([summary(manifest) for manifest in backup_store.list()]), 200
+
+@data_bp.route('/backups', methods=['POST'])
+@login_required
+def create_backup_view():
+    try:
+        return jsonify(summary(create_backup())), 201
+    except Exception as e:
+        print(f"Error in create_backup: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return jsonify({'error': f'Failed to create backup: {str(e)}'}), 500
+
+@data_bp.route('/backups/<backup_id>', methods=['GET'])
+@login_required
+def get_backup(backup_id):
+    manifest = backup_store.get(backup_id)
+    if manifest is None:
+        return jsonify({'error': 'Backup not found'}), 404
+    return jsonify(summary(manifest)), 200
+
+@data_bp.route('/backups/<backup_id>/export', methods=['GET'])
+@login_required
+def export_backup(backup_id):
+    manifest = backup_store.get(backup_id)
+    if manifest is None:
+        return jsonify({'error': 'Backup not found'}), 404
+    # Same layout as /export, so the file can be imported anywhere
+    export_data = {filename: backup_store.read_file(manifest, filename) for filename in manifest['files']}
+    return send_file(
+        io.BytesIO(codec.dumps(export_data, codec.wants_pretty())),
+        mimetype='application/json; charset=utf-8',
+        as_attachment=True,
+        download_name=f'accounted-backup-{backup_id}.json'
+    )
+
+@data_bp.route('/backups/restore', methods=['POST'])
+@login_required
+def restore_backup_view():
+    params = request.get_json(silent=True) or {}
+    try:
+        manifest = find_backup(params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if manifest is None:
+        return jsonify({'error': 'Backup not found'}), 404
+    try:
+        restore_backup(manifest)
+        return jsonify({'message': 'Backup restored successfully', 'backup': manifest['id']}), 200
+    except Exception as e:
+        print(f"Error in restore_backup: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return jsonify({'error': f'Failed to restore backup: {str(e)}'}), 500
@@ -1,27 +1,57 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from flask_login import login_required
-import json
-import os
 from datetime import datetime
+from utils import codec, responses
+from utils.invoice_store import get_invoice_store
+from models import Invoice, InvoiceItem
 
 invoices_bp = Blueprint('invoices', __name__)
 
-INVOICES_FILE = 'data/invoices.json'
+# One JSON record per line; see utils/invoice_store.py
+INVOICES_FILE = 'data/invoices.ndjson'
 
-def ensure_invoices_file():
-    os.makedirs('data', exist_ok=True)
-    if not os.path.exists(INVOICES_FILE):
-        with open(INVOICES_FILE, 'w') as f:
-            json.dump([], f)
+def get_store():
+    return get_invoice_store(INVOICES_FILE)
 
 @invoices_bp.route('/api/invoices', methods=['GET'])
 @login_required
 def get_invoices():
-    ensure_invoices_file()
-    with open(INVOICES_FILE, 'r') as f:
-        invoices = json.load(f)
+    invoice_store = get_store()
+    version, mtime_ns = invoice_store.version_info()
+    # Too big to cache: stream the stored records as-is (compact, even with ?pretty)
+    return responses.collection_response('invoices', version, mtime_ns, build_invoice_list,
+                                         size=invoice_store.live_bytes(), stream=invoice_store.iter_json_array)
+
+def build_invoice_list(pretty):
+    if pretty:
+        return codec.dumps(list(get_store().iter_records()), True)
+    # Join the stored records as-is instead of decoding and re-encoding them
+    return b''.join(get_store().iter_json_array())
+
+@invoices_bp.route('/api/invoices/<invoice_id>', methods=['GET'])
+@login_required
+def get_invoice(invoice_id):
+    invoice = get_store().get_raw(invoice_id)
+    if invoice is None:
+        return jsonify({'error': 'Invoice not found'}), 404
+    return Response(invoice, mimetype='application/json'), 200
+
+@invoices_bp.route('/api/customers/<customer_id>/invoices', methods=['GET'])
+@login_required
+def get_customer_invoices(customer_id):
+    invoices = get_store().for_customer(customer_id)
+    status = request.args.get('status')
+    if status:
+        invoices = [inv for inv in invoices if inv.get('status') == status]
     return jsonify(invoices), 200
 
+def parse_items(items):
+    """Parse invoice items from a request; returns (items, error message)."""
+    try:
+        return [InvoiceItem.from_dict(item) for item in items], None
+    except (KeyError, TypeError, ValueError, ArithmeticError, AttributeError):
+        return None, 'Invalid items: each item needs a numeric quantity and unit_price'
+
 @invoices_bp.route('/api/invoices', methods=['POST'])
 @login_required
 def create_invoice():
@@ -31,38 +61,29 @@ def create_invoice():
     if not all(field in data for field in required_fields):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    ensure_invoices_file()
-    
-    with open(INVOICES_FILE, 'r') as f:
-        invoices = json.load(f)
+    items, error = parse_items(data['items'])
+    if error:
+        return jsonify({'error': error}), 400
 
-    # Generate a simple ID (in a real app, use UUID)
-    invoice_id = str(len(invoices) + 1)
-    
-    # Calculate total and tax
-    subtotal = sum(item['quantity'] * item['unit_price'] for item in data['items'])
-    tax_rate = data.get('tax_rate', 0.1)  # Default 10% tax
-    tax_amount = subtotal * tax_rate
-    total = subtotal + tax_amount
-    
-    new_invoice = {
-        'id': invoice_id,
-        'date': data.get('date', datetime.now().isoformat()),
-        'customer_id': data['customer_id'],
-        'items': data['items'],
-        'subtotal': subtotal,
-        'tax_rate': tax_rate,
-        'tax_amount': tax_amount,
-        'total': total,
-        'status': data.get('status', 'pending'),
-        'payment_date': data.get('payment_date'),
-        'payment_info': data.get('payment_info')
-    }
-    
-    invoices.append(new_invoice)
-    
-    with open(INVOICES_FILE, 'w') as f:
-        json.dump(invoices, f, indent=2)
+    invoice_store = get_store()
+
+    # Hold the write lock so concurrent creates, in any worker, can't get the same id
+    with invoice_store.write_lock:
+        # Generate a simple ID (in a real app, use UUID)
+        invoice = Invoice(
+            id=invoice_store.next_id(),
+            date=data.get('date', datetime.now().isoformat()),
+            customer_id=data['customer_id'],
+            items=items,
+            tax_rate=data.get('tax_rate', Invoice.DEFAULT_TAX_RATE),  # Default 10% tax
+            status=data.get('status', 'pending'),
+            payment_date=data.get('payment_date'),
+            payment_info=data.get('payment_info')
+        )
+        # Calculate total and tax in cents
+        invoice.recalculate()
+        new_invoice = invoice.to_dict()
+        invoice_store.put(new_invoice)
     
     return jsonify(new_invoice), 201
 
@@ -71,59 +92,44 @@ def create_invoice():
 def update_invoice(invoice_id):
     data = request.get_json()
     
-    ensure_invoices_file()
+    if 'items' in data:
+        items, error = parse_items(data['items'])
+        if error:
+            return jsonify({'error': error}), 400
     
-    with open(INVOICES_FILE, 'r') as f:
-        invoices = json.load(f)
+    invoice_store = get_store()
     
-    for invoice in invoices:
-        if invoice['id'] == invoice_id:
-            # Recalculate totals if items are updated
-            if 'items' in data:
-                subtotal = sum(item['quantity'] * item['unit_price'] for item in data['items'])
-                tax_rate = data.get('tax_rate', invoice['tax_rate'])
-                tax_amount = subtotal * tax_rate
-                total = subtotal + tax_amount
-                
-                invoice.update({
-                    'items': data['items'],
-                    'subtotal': subtotal,
-                    'tax_rate': tax_rate,
-                    'tax_amount': tax_amount,
-                    'total': total
-                })
-            
-            # Update other fields
-            invoice.update({
-                'date': data.get('date', invoice['date']),
-                'customer_id': data.get('customer_id', invoice['customer_id']),
-                'status': data.get('status', invoice['status']),
-                'payment_date': data.get('payment_date', invoice.get('payment_date')),
-                'payment_info': data.get('payment_info', invoice.get('payment_info'))
-            })
-            
-            with open(INVOICES_FILE, 'w') as f:
-                json.dump(invoices, f, indent=2)
-            
-            return jsonify(invoice), 200
+    with invoice_store.write_lock:
+        stored = invoice_store.get(invoice_id)
+        if stored is None:
+            return jsonify({'error': 'Invoice not found'}), 404
+        # Stored items are only parsed when replaced, so legacy items pass through untouched
+        invoice = Invoice.from_dict(stored, with_items=False)
+        
+        # Recalculate totals if items are updated
+        if 'items' in data:
+            invoice.items = items
+            invoice.tax_rate = data.get('tax_rate', invoice.tax_rate)
+            invoice.recalculate()
+        
+        # Update other fields
+        invoice.date = data.get('date', invoice.date)
+        invoice.customer_id = data.get('customer_id', invoice.customer_id)
+        invoice.status = data.get('status', invoice.status)
+        invoice.payment_date = data.get('payment_date', invoice.payment_date)
+        invoice.payment_info = data.get('payment_info', invoice.payment_info)
+        
+        updated_invoice = invoice.to_dict()
+        if 'items' not in data:
+            updated_invoice['items'] = stored.get('items', [])
+        invoice_store.put(updated_invoice)
     
-    return jsonify({'error': 'Invoice not found'}), 404
+    return jsonify(updated_invoice), 200
 
 @invoices_bp.route('/api/invoices/<invoice_id>', methods=['DELETE'])
 @login_required
 def delete_invoice(invoice_id):
-    ensure_invoices_file()
-    
-    with open(INVOICES_FILE, 'r') as f:
-        invoices = json.load(f)
-    
-    for i, invoice in enumerate(invoices):
-        if invoice['id'] == invoice_id:
-            del invoices[i]
-            
-            with open(INVOICES_FILE, 'w') as f:
-                json.dump(invoices, f, indent=2)
-            
-            return jsonify({'message': 'Invoice deleted successfully'}), 200
+    if get_store().delete(invoice_id):
+        return jsonify({'message': 'Invoice deleted successfully'}), 200
     
     return jsonify({'error': 'Invoice not found'}), 404 
\ No newline at end of file
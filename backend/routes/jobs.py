@@ -0,0 +1,81 @@
+from flask import Blueprint, jsonify, request, send_file, current_app
+from flask_login import login_required, current_user
+import io
+from utils.jobs import job_manager, QueueFull, SUCCEEDED
+from routes.data import read_upload
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+def get_own_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None or job.owner_id != current_user.get_id():
+        return None
+    return job
+
+@jobs_bp.route('', methods=['POST'])
+@login_required
+def create_job():
+    if request.files:
+        # Imports are posted as multipart forms: type=import plus the backup file
+        job_type = request.form.get('type', 'import')
+        content, error = read_upload()
+        if error:
+            return jsonify({'error': error}), 400
+        params = {'content': content}
+    else:
+        data = request.get_json(silent=True) or {}
+        job_type = data.get('type')
+        params = data.get('params', {})
+        if not isinstance(params, dict):
+            return jsonify({'error': 'Invalid job parameters'}), 400
+
+    if job_type not in job_manager.handlers:
+        return jsonify({'error': 'Unknown job type', 'job_types': sorted(job_manager.handlers)}), 400
+
+    try:
+        job = job_manager.submit(job_type, params, current_user.get_id(), current_app._get_current_object())
+    except QueueFull:
+        return jsonify({'error': 'Too many jobs queued, try again later'}), 429
+
+    return jsonify(job.to_dict()), 202
+
+@jobs_bp.route('', methods=['GET'])
+@login_required
+def list_jobs():
+    return jsonify([job.to_dict() for job in job_manager.list(current_user.get_id())]), 200
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = get_own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@jobs_bp.route('/<job_id>', methods=['DELETE'])
+@login_required
+def cancel_job(job_id):
+    job = get_own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job_manager.cancel(job_id)
+    return jsonify(job.to_dict()), 200
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+@login_required
+def get_job_result(job_id):
+    job = get_own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != SUCCEEDED:
+        return jsonify({'error': f'Job is {job.status}', 'job': job.to_dict()}), 409
+    if job.result is None:
+        return jsonify({'error': 'Job has no result'}), 404
+
+    result = job.result
+    return send_file(
+        io.BytesIO(result.data),
+        mimetype=result.mimetype,
+        as_attachment=result.filename is not None,
+        download_name=result.filename
+    )
@@ -1,45 +1,63 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
-import json
+from utils import codec, store
 import os
 from datetime import datetime, timedelta
 from collections import defaultdict
+from utils.invoice_store import get_invoice_store
+from models import Customer, Invoice, to_cents, from_cents
+from utils.jobs import job_manager, JobResult
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
-INVOICES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'invoices.json')
+INVOICES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'invoices.ndjson')
 CUSTOMERS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'customers.json')
 
+# Unpaid invoice statuses that count towards receivables
+OUTSTANDING_STATUSES = ('pending', 'overdue')
+
+# Aging buckets as (label, first day, last day); None means open-ended
+AGING_BUCKETS = [
+    ('0-30', 0, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None)
+]
+
 def ensure_data_files():
-    os.makedirs(os.path.dirname(INVOICES_FILE), exist_ok=True)
-    if not os.path.exists(INVOICES_FILE):
-        with open(INVOICES_FILE, 'w') as f:
-            json.dump([], f)
+    os.makedirs(os.path.dirname(CUSTOMERS_FILE), exist_ok=True)
     if not os.path.exists(CUSTOMERS_FILE):
-        with open(CUSTOMERS_FILE, 'w') as f:
-            json.dump([], f)
+        codec.dump_file([], CUSTOMERS_FILE)
 
-def load_data():
+def load_customers():
     ensure_data_files()
     try:
-        with open(INVOICES_FILE, 'r') as f:
-            invoices = json.load(f)
-        with open(CUSTOMERS_FILE, 'r') as f:
-            customers = json.load(f)
-        return invoices, customers
+        return store.read(CUSTOMERS_FILE)
     except Exception as e:
-        print(f"Error loading data: {str(e)}")
-        return [], []
+        print(f"Error loading customers: {str(e)}")
+        return []
 
-@reports_bp.route('/profit-loss', methods=['GET'])
-@login_required
-def get_profit_loss():
+def load_invoices(*statuses):
+    # Reports only need totals, so legacy items with missing fields can't break them
+    return [Invoice.from_dict(inv, with_items=False) for inv in get_invoice_store(INVOICES_FILE).with_status(*statuses)]
+
+def load_customer_records():
+    return {c['id']: Customer.from_dict(c) for c in load_customers()}
+
+def get_aging_bucket(days):
+    for label, first, last in AGING_BUCKETS:
+        if days >= first and (last is None or days <= last):
+            return label
+    return AGING_BUCKETS[0][0]
+
+def build_profit_loss(args):
     try:
-        invoices, _ = load_data()
+        ensure_data_files()
+        invoices = load_invoices('paid')
         
         # Get date range from query parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        start_date = args.get('start_date')
+        end_date = args.get('end_date')
         
         # Filter invoices by date range if provided
         if start_date and end_date:
@@ -48,20 +66,20 @@ def get_profit_loss():
                 end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
                 invoices = [
                     inv for inv in invoices
-                    if start_date <= datetime.fromisoformat(inv['date'].replace('Z', '+00:00')) <= end_date
+                    if start_date <= datetime.fromisoformat(inv.date.replace('Z', '+00:00')) <= end_date
                 ]
             except ValueError as e:
                 print(f"Date parsing error: {str(e)}")
                 return jsonify({'error': 'Invalid date format'}), 400
         
-        # Calculate totals
-        total_income = sum(inv['total'] for inv in invoices if inv['status'] == 'paid')
+        # Calculate totals (in cents)
+        total_income = sum(inv.total for inv in invoices)
         total_expenses = 0  # In a real app, this would come from expense records
         
         profit_loss = {
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'net_profit': total_income - total_expenses,
+            'total_income': from_cents(total_income),
+            'total_expenses': from_cents(total_expenses),
+            'net_profit': from_cents(total_income - total_expenses),
             'period': {
                 'start_date': start_date.isoformat() if start_date else None,
                 'end_date': end_date.isoformat() if end_date else None
@@ -73,15 +91,15 @@ def get_profit_loss():
         print(f"Error in profit-loss: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@reports_bp.route('/top-customers', methods=['GET'])
-@login_required
-def get_top_customers():
+def build_top_customers(args):
     try:
-        invoices, customers = load_data()
+        ensure_data_files()
+        invoices = load_invoices('paid')
+        customers = load_customer_records()
         
         # Get date range from query parameters
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        start_date = args.get('start_date')
+        end_date = args.get('end_date')
         
         # Filter invoices by date range if provided
         if start_date and end_date:
@@ -90,7 +108,7 @@ def get_top_customers():
                 end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
                 invoices = [
                     inv for inv in invoices
-                    if start_date <= datetime.fromisoformat(inv['date'].replace('Z', '+00:00')) <= end_date
+                    if start_date <= datetime.fromisoformat(inv.date.replace('Z', '+00:00')) <= end_date
                 ]
             except ValueError as e:
                 print(f"Date parsing error: {str(e)}")
@@ -99,9 +117,8 @@ def get_top_customers():
         # Calculate customer totals
         customer_totals = {}
         for invoice in invoices:
-            if invoice['status'] == 'paid':
-                customer_id = invoice['customer_id']
-                customer_totals[customer_id] = customer_totals.get(customer_id, 0) + invoice['total']
+            customer_id = invoice.customer_id
+            customer_totals[customer_id] = customer_totals.get(customer_id, 0) + invoice.total
         
         # Sort customers by total revenue
         sorted_customers = sorted(customer_totals.items(), key=lambda x: x[1], reverse=True)
@@ -109,12 +126,12 @@ def get_top_customers():
         # Get top 5 customers with their details
         top_customers = []
         for customer_id, total in sorted_customers[:5]:
-            customer = next((c for c in customers if c['id'] == customer_id), None)
+            customer = customers.get(customer_id)
             if customer:
                 top_customers.append({
-                    'id': customer['id'],
-                    'name': f"{customer['first_name']} {customer['last_name']}",
-                    'revenue': total
+                    'id': customer.id,
+                    'name': customer.name,
+                    'revenue': from_cents(total)
                 })
         
         return jsonify(top_customers), 200
@@ -122,6 +139,63 @@ def get_top_customers():
         print(f"Error in top-customers: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def build_receivables_aging(args):
+    try:
+        ensure_data_files()
+        # Only unpaid invoices are read, straight from the status index
+        invoices = load_invoices(*OUTSTANDING_STATUSES)
+        customers = load_customer_records()
+
+        as_of = args.get('as_of')
+        try:
+            as_of = datetime.fromisoformat(as_of.replace('Z', '+00:00')).date() if as_of else datetime.now().date()
+        except ValueError as e:
+            print(f"Date parsing error: {str(e)}")
+            return jsonify({'error': 'Invalid date format'}), 400
+
+        bucket_labels = [label for label, _, _ in AGING_BUCKETS]
+        totals = dict.fromkeys(bucket_labels, 0)
+        rows = {}
+        for invoice in invoices:
+            try:
+                invoice_date = datetime.fromisoformat(invoice.date.replace('Z', '+00:00')).date()
+            except (AttributeError, ValueError) as e:
+                print(f"Error processing invoice date: {str(e)}")
+                continue
+
+            bucket = get_aging_bucket((as_of - invoice_date).days)
+            customer_id = invoice.customer_id
+            row = rows.get(customer_id)
+            if row is None:
+                customer = customers.get(customer_id)
+                row = rows[customer_id] = {
+                    'customer_id': customer_id,
+                    'name': customer.name if customer else None,
+                    'buckets': dict.fromkeys(bucket_labels, 0),
+                    'total': 0,
+                    'invoice_count': 0
+                }
+            row['buckets'][bucket] += invoice.total
+            row['total'] += invoice.total
+            row['invoice_count'] += 1
+            totals[bucket] += invoice.total
+
+        # Amounts were summed in cents; convert once for the response
+        customers_out = sorted(rows.values(), key=lambda r: r['total'], reverse=True)
+        for row in customers_out:
+            row['buckets'] = {label: from_cents(cents) for label, cents in row['buckets'].items()}
+            row['total'] = from_cents(row['total'])
+
+        return jsonify({
+            'as_of': as_of.isoformat(),
+            'customers': customers_out,
+            'totals': {label: from_cents(cents) for label, cents in totals.items()},
+            'total': from_cents(sum(totals.values()))
+        }), 200
+    except Exception as e:
+        print(f"Error in receivables-aging: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 def get_reports_file():
     data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
     os.makedirs(data_dir, exist_ok=True)
@@ -138,11 +212,10 @@ def get_default_date_range():
     
     return previous_month_start.strftime('%Y-%m-%d'), current_month_end.strftime('%Y-%m-%d')
 
-@reports_bp.route('/income-expenses', methods=['GET'])
-def get_income_expenses():
+def build_income_expenses(args):
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        start_date = args.get('start_date')
+        end_date = args.get('end_date')
 
         # If dates are not provided, use default range (previous month to current month)
         if not start_date or not end_date:
@@ -170,12 +243,9 @@ def get_income_expenses():
 
         # Read invoices data
         try:
-            with open(INVOICES_FILE, 'r') as f:
-                invoices = json.load(f)
-                if not isinstance(invoices, list):
-                    print("Error: Invalid data format in invoices file")
-                    invoices = []
-        except json.JSONDecodeError:
+            # Decoded one at a time straight from the store
+            invoices = get_invoice_store(INVOICES_FILE).iter_records()
+        except codec.JSONDecodeError:
             print("Error: Invalid JSON in invoices file")
             invoices = []
         except Exception as e:
@@ -201,7 +271,7 @@ def get_income_expenses():
         expenses = 0
         for invoice in filtered_invoices:
             try:
-                total = float(invoice.get('total', 0))
+                total = to_cents(invoice.get('total'), 0)
                 invoice_type = invoice.get('type', '').lower()
                 if invoice_type == 'income':
                     income += total
@@ -214,9 +284,9 @@ def get_income_expenses():
         net = income - expenses
 
         response = {
-            'income': income,
-            'expenses': expenses,
-            'net': net,
+            'income': from_cents(income),
+            'expenses': from_cents(expenses),
+            'net': from_cents(net),
             'start_date': start_date,
             'end_date': end_date,
             'invoice_count': len(filtered_invoices)
@@ -238,4 +308,38 @@ def get_income_expenses():
             'end_date': end_date if 'end_date' in locals() else None,
             'invoice_count': 0,
             'message': 'Error generating report'
-        }) 
\ No newline at end of file
+        })
+
+@reports_bp.route('/profit-loss', methods=['GET'])
+@login_required
+def get_profit_loss():
+    return build_profit_loss(request.args)
+
+@reports_bp.route('/top-customers', methods=['GET'])
+@login_required
+def get_top_customers():
+    return build_top_customers(request.args)
+
+@reports_bp.route('/receivables-aging', methods=['GET'])
+@login_required
+def get_receivables_aging():
+    return build_receivables_aging(request.args)
+
+@reports_bp.route('/income-expenses', methods=['GET'])
+def get_income_expenses():
+    return build_income_expenses(request.args)
+
+def report_job(build):
+    def run(job, params):
+        job.set_progress(0, 'Generating report')
+        response = build(params or {})
+        response, status = response if isinstance(response, tuple) else (response, 200)
+        if status >= 400:
+            raise ValueError(response.get_json().get('error', 'Report failed'))
+        return JobResult(response.get_data())
+    return run
+
+job_manager.register('report:profit-loss', report_job(build_profit_loss))
+job_manager.register('report:top-customers', report_job(build_top_customers))
+job_manager.register('report:receivables-aging', report_job(build_receivables_aging))
+job_manager.register('report:income-expenses', report_job(build_income_expenses))
@@ -0,0 +1,187 @@
+"""Production entry point: a pre-forking server with several worker processes.
+
+The app (and with it the parsed data files and invoice indexes) is loaded
+once in the parent; workers are forked from it and share those pages
+copy-on-write. Each worker accepts connections from the shared listening
+socket and handles them on a pool of threads.
+
+    python backend/serve.py --workers 4 --threads 8 --port 5000
+
+Settings can also come from SERVER_HOST, SERVER_PORT, SERVER_WORKERS and
+SERVER_THREADS. Where os.fork isn't available (Windows) it runs a single
+threaded process.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Seconds to wait for workers to finish in-flight requests on shutdown
+SHUTDOWN_TIMEOUT = 10
+
+# Idle keep-alive connections are closed after this many seconds so they
+# can't tie up the worker's request threads
+KEEPALIVE_TIMEOUT = 5
+
+
+class RequestHandler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug's server with requests handled on a fixed pool of threads."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Accounted backend with several worker processes.')
+    parser.add_argument('--host', default=os.getenv('SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERVER_PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVER_WORKERS', str(os.cpu_count() or 1))))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVER_THREADS', '8')))
+    args = parser.parse_args(argv)
+    args.workers = max(1, args.workers)
+    args.threads = max(1, args.threads)
+    return args
+
+
+def listen(host, port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    return sock
+
+
+def run_worker(app, sock, args):
+    server = PooledWSGIServer(args.host, args.port, app, args.threads, fd=sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever to return, so it can't run on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        # Let in-flight requests finish before closing the socket
+        server.pool.shutdown(wait=True)
+        server.server_close()
+
+
+def spawn_worker(app, sock, args):
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 0
+    try:
+        run_worker(app, sock, args)
+    except BaseException as e:
+        print(f"Worker {os.getpid()} crashed: {str(e)}")
+        status = 1
+    # Skip the parent's atexit handlers (e.g. the snapshot save)
+    os._exit(status)
+
+
+def supervise(app, sock, args):
+    workers = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        pid = spawn_worker(app, sock, args)
+        workers[pid] = time.monotonic()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+
+    deadline = None
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if stopping and deadline is None:
+                deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+            if deadline is not None and time.monotonic() > deadline:
+                for pid in workers:
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float('inf')
+            time.sleep(0.2)
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started < 1:
+            # Don't spin if workers die right away
+            time.sleep(1)
+        new_pid = spawn_worker(app, sock, args)
+        workers[new_pid] = time.monotonic()
+    sock.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sock = listen(args.host, args.port)
+
+    # Importing the app warms the caches; workers inherit them
+    from app import app
+    from utils import admission, snapshot
+    from utils.jobs import job_manager
+
+    # Queued admission requests wait on pool threads; keep some free for everything else
+    admission.fit_threads(args.threads)
+
+    if not hasattr(os, 'fork'):
+        print(f"os.fork is unavailable; serving on http://{args.host}:{args.port} with 1 worker x {args.threads} threads")
+        run_worker(app, sock, args)
+        return
+
+    # A save still running would leave its lock held in every worker
+    snapshot.wait()
+    # Workers are processes, so jobs are published on disk for whichever one gets asked about them
+    job_manager.share(os.path.join(snapshot.DATA_DIR, '.jobs'))
+    # Keep the loaded data out of the workers' collections too, so its pages stay shared
+    gc.collect()
+    gc.freeze()
+    supervise(app, sock, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
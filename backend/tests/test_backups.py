@@ -0,0 +1,91 @@
+import pytest
+
+from utils import codec
+from utils import invoice_store as invoice_store_module
+from utils.backups import BackupStore
+from utils.invoice_store import InvoiceStore
+
+
+def invoice(invoice_id, status='pending'):
+    return {'id': invoice_id, 'customer_id': '1', 'status': status, 'total': 10.0}
+
+
+@pytest.fixture
+def backups(tmp_path):
+    return BackupStore(str(tmp_path / 'backups'))
+
+
+@pytest.fixture
+def invoice_store(tmp_path):
+    return InvoiceStore(str(tmp_path / 'invoices.ndjson')).open()
+
+
+def back_up(backups, invoice_store):
+    version, _ = invoice_store.version_info()
+    return backups.create([('invoices.json', version, invoice_store.iter_raw, invoice_store.log_view())])
+
+
+def test_incremental_backup_only_reads_appended_lines(backups, invoice_store):
+    for i in range(1, 51):
+        invoice_store.put(invoice(str(i)))
+    first = back_up(backups, invoice_store)
+
+    invoice_store.put(invoice('7', status='paid'))
+    invoice_store.delete('8')
+    invoice_store.put(invoice('51'))
+    second = back_up(backups, invoice_store)
+
+    first_chunks = first['files']['invoices.json']['chunks']
+    assert second['files']['invoices.json']['chunks'][:len(first_chunks)] == first_chunks
+    assert second['stats']['new_chunks'] <= 2
+    assert second['files']['invoices.json']['records'] == 53
+
+    assert [r['id'] for r in backups.read_file(first, 'invoices.json')] == [str(i) for i in range(1, 51)]
+    restored = backups.read_file(second, 'invoices.json')
+    assert restored == list(invoice_store.iter_records())
+    assert restored[6]['status'] == 'paid'
+
+
+def test_unchanged_store_is_carried_over(backups, invoice_store):
+    invoice_store.put(invoice('1'))
+    first = back_up(backups, invoice_store)
+    second = back_up(backups, invoice_store)
+    assert second['files']['invoices.json'] == first['files']['invoices.json']
+    assert second['stats']['unchanged_files'] == 1
+
+
+def test_rewritten_file_is_backed_up_in_full(backups, invoice_store, monkeypatch):
+    for i in range(1, 11):
+        invoice_store.put(invoice(str(i)))
+    first = back_up(backups, invoice_store)
+
+    monkeypatch.setattr(invoice_store_module, 'COMPACT_MIN_DEAD_BYTES', 1)
+    for i in range(1, 9):
+        invoice_store.delete(str(i))
+    second = back_up(backups, invoice_store)
+
+    # Not continued from the first backup's log, whatever inode the new file got
+    assert second['files']['invoices.json']['records'] == 2
+    assert [r['id'] for r in backups.read_file(second, 'invoices.json')] == ['9', '10']
+
+
+def test_log_is_not_continued_when_its_earlier_bytes_changed(backups, invoice_store):
+    for i in range(1, 4):
+        invoice_store.put(invoice(str(i)))
+    first = back_up(backups, invoice_store)
+    log_id, view, end = invoice_store.log_view()
+
+    # Same log id and a longer file, but different bytes before the old end,
+    # as when a compacted file reuses the old inode number
+    data = codec.dumps(invoice('1', status='void')) + b'\n' + bytes(view[:end]) + codec.dumps(invoice('4')) + b'\n'
+    manifest = backups.create([('invoices.json', 'v2', None, (log_id, data, len(data)))])
+
+    assert manifest['files']['invoices.json']['records'] == 5
+    assert backups.read_file(manifest, 'invoices.json')[0]['status'] == 'pending'
+    assert first['files']['invoices.json']['records'] == 3
+
+
+def test_backups_in_the_same_microsecond_keep_creation_order(backups):
+    manifests = [backups.create([]) for _ in range(3)]
+    assert backups.ids() == sorted(m['id'] for m in manifests)
+    assert [m['id'] for m in backups.list()] == [m['id'] for m in manifests]
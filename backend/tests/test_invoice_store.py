@@ -0,0 +1,166 @@
+import os
+
+import pytest
+
+from utils import invoice_store as invoice_store_module
+from utils.invoice_store import InvoiceStore
+
+
+def invoice(invoice_id, status='pending', customer_id='1', note=''):
+    return {'id': invoice_id, 'customer_id': customer_id, 'status': status, 'total': 10.0, 'note': note}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'invoices.ndjson')
+
+
+@pytest.fixture
+def compact_eagerly(monkeypatch):
+    monkeypatch.setattr(invoice_store_module, 'COMPACT_MIN_DEAD_BYTES', 1)
+
+
+def test_deleted_ids_are_not_reissued(path):
+    store = InvoiceStore(path).open()
+    for i in range(1, 6):
+        store.put(invoice(str(i)))
+    store.delete('5')
+    assert store.next_id() == '6'
+
+
+def test_deleted_ids_are_not_reissued_after_compaction(path, compact_eagerly):
+    store = InvoiceStore(path).open()
+    for i in range(1, 6):
+        store.put(invoice(str(i)))
+    for invoice_id in ('5', '4', '3'):
+        store.delete(invoice_id)
+
+    assert [r['id'] for r in store.iter_records()] == ['1', '2']
+    assert store.next_id() == '6'
+    # The high-water mark survives in the files, not just in memory
+    assert InvoiceStore(path).open().next_id() == '6'
+
+
+def test_compaction_keeps_live_records_order_and_indexes(path, monkeypatch):
+    store = InvoiceStore(path).open()
+    for i in range(1, 11):
+        store.put(invoice(str(i), note='x' * 100))
+    for i in range(1, 11):
+        store.put(invoice(str(i), status='overdue' if i == 3 else 'paid', note='x' * 100))
+    assert store.dead_bytes > 0
+
+    # The delete tips dead bytes over live ones, so it compacts
+    monkeypatch.setattr(invoice_store_module, 'COMPACT_MIN_DEAD_BYTES', 1)
+    store.delete('7')
+
+    live = list(store.iter_raw())
+    assert os.path.getsize(path) == sum(len(raw) + 1 for raw in live)
+    assert store.dead_bytes == 0
+    assert [r['id'] for r in store.iter_records()] == ['1', '2', '3', '4', '5', '6', '8', '9', '10']
+    assert store.get('3')['status'] == 'overdue'
+    assert store.get('7') is None
+    assert [r['id'] for r in store.with_status('overdue')] == ['3']
+    assert 'pending' not in store.indexes['status']
+    assert store.count() == 9
+
+    reopened = InvoiceStore(path).open()
+    assert list(reopened.iter_records()) == list(store.iter_records())
+    assert [r['id'] for r in reopened.with_status('overdue')] == ['3']
+    assert reopened.next_id() == '11'
+
+
+def test_other_instance_sees_compaction_and_appends(path, compact_eagerly):
+    writer = InvoiceStore(path).open()
+    reader = InvoiceStore(path).open()
+    for i in range(1, 4):
+        writer.put(invoice(str(i)))
+    assert reader.count() == 3
+
+    writer.delete('2')
+    reader.put(invoice('4'))
+    assert [r['id'] for r in writer.iter_records()] == ['1', '3', '4']
+    assert [r['id'] for r in reader.iter_records()] == ['1', '3', '4']
+
+
+def test_corrupt_sidecar_is_rebuilt(path):
+    store = InvoiceStore(path).open()
+    for i in range(1, 4):
+        store.put(invoice(str(i)))
+    with open(f'{path}.idx', 'wb') as f:
+        f.write(b'not json\n')
+
+    reopened = InvoiceStore(path).open()
+    assert [r['id'] for r in reopened.iter_records()] == ['1', '2', '3']
+    assert reopened.next_id() == '4'
+
+
+def test_catching_up_does_not_duplicate_sidecar_entries(path):
+    first = InvoiceStore(path).open()
+    second = InvoiceStore(path).open()
+    for i in range(1, 4):
+        first.put(invoice(str(i)))
+        second.put(invoice(str(i + 10)))
+    assert first.count() == second.count() == 6
+
+    reopened = InvoiceStore(path).open()
+    assert reopened.dead_bytes == 0
+    assert reopened.live_bytes() == os.path.getsize(path)
+    with open(path, 'rb') as data, open(f'{path}.idx', 'rb') as index:
+        assert len(index.readlines()) == len(data.readlines())
+
+
+def test_crash_before_sidecar_write_is_indexed_once(path):
+    store = InvoiceStore(path).open()
+    store.put(invoice('1'))
+    # A writer that died between appending its line and its sidecar entry
+    with open(path, 'ab') as f:
+        f.write(b'{"id":"2","status":"paid","customer_id":"1"}\n')
+
+    store.put(invoice('3'))
+    assert [r['id'] for r in store.iter_records()] == ['1', '2', '3']
+    with open(f'{path}.idx', 'rb') as index:
+        assert [line.split(b',', 1)[0] for line in index] == [b'["1"', b'["2"', b'["3"']
+    assert InvoiceStore(path).open().dead_bytes == 0
+
+
+def test_half_written_line_is_dropped_before_appending(path):
+    store = InvoiceStore(path).open()
+    store.put(invoice('1'))
+    with open(path, 'ab') as f:
+        f.write(b'{"id":"2","sta')
+
+    store.put(invoice('3'))
+    os.remove(f'{path}.idx')
+    reopened = InvoiceStore(path).open()
+    assert [r['id'] for r in reopened.iter_records()] == ['1', '3']
+
+
+def test_rebuild_skips_unreadable_lines(path):
+    store = InvoiceStore(path).open()
+    store.put(invoice('1'))
+    with open(path, 'ab') as f:
+        f.write(b'{"id":"2","sta\n')
+    store.put(invoice('3'))
+    os.remove(f'{path}.idx')
+
+    reopened = InvoiceStore(path).open()
+    assert [r['id'] for r in reopened.iter_records()] == ['1', '3']
+    assert reopened.next_id() == '4'
+
+
+def test_compaction_copies_live_lines_verbatim(path, monkeypatch):
+    store = InvoiceStore(path).open()
+    store.put(invoice('1'))
+    # Written by hand, so re-encoding it would change its bytes
+    line = b'{"id": "2", "status": "paid", "customer_id": "1", "total": 10.50}'
+    with open(path, 'ab') as f:
+        f.write(line + b'\n')
+    store.put(invoice('1', status='paid'))
+
+    monkeypatch.setattr(invoice_store_module, 'COMPACT_MIN_DEAD_BYTES', 1)
+    store.delete('1')
+
+    with open(path, 'rb') as f:
+        assert f.read() == line + b'\n'
+    assert [r['id'] for r in store.with_status('paid')] == ['2']
+    assert store.next_id() == '3'
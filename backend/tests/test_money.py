@@ -0,0 +1,90 @@
+import pytest
+
+from models.money import from_cents, multiply_cents, to_cents
+from models.records import Invoice, InvoiceItem
+from routes.invoices import parse_items
+
+
+@pytest.mark.parametrize('amount, cents', [
+    (12, 1200),
+    (2.35, 235),
+    (0.1, 10),
+    ('19.99', 1999),
+    # Float noise is absorbed, not rounded up a cent
+    (7.7000000000000001, 770),
+    (0.1 + 0.2, 30),
+    # Beyond whole cents, half rounds up
+    (1.005, 101),
+    ('0.125', 13),
+])
+def test_to_cents(amount, cents):
+    assert to_cents(amount) == cents
+
+
+def test_to_cents_default_only_for_missing_amounts():
+    assert to_cents(None, 0) == 0
+    with pytest.raises(ValueError):
+        to_cents(None)
+
+
+@pytest.mark.parametrize('amount', [True, 'abc', float('nan')])
+def test_to_cents_rejects_non_numbers(amount):
+    with pytest.raises((TypeError, ValueError)):
+        to_cents(amount)
+
+
+def test_multiply_cents_rounds_half_up():
+    assert multiply_cents(235, 3) == 705
+    assert multiply_cents(705, 0.1) == 71
+    assert multiply_cents(125, 0.5) == 63
+    assert multiply_cents(333, 1.5) == 500
+
+
+def test_recalculate_is_exact():
+    invoice = Invoice('1', '2026-01-01', '1', [InvoiceItem('Widget', 3, to_cents(2.35))]).recalculate()
+    assert (invoice.subtotal, invoice.tax_amount, invoice.total) == (705, 71, 776)
+    assert from_cents(invoice.total) == 7.76
+
+    # Ten 0.1 items add up to exactly 1.00, where floats give 0.9999999999999999
+    invoice = Invoice('2', '2026-01-01', '1', [InvoiceItem('', 1, to_cents(0.1)) for _ in range(10)],
+                      tax_rate=0).recalculate()
+    assert invoice.total == 100
+
+
+def test_invoice_round_trip():
+    data = {'id': '1', 'date': '2026-01-01', 'customer_id': '1', 'tax_rate': 0.1, 'status': 'paid',
+            'items': [{'description': 'Widget', 'quantity': 3, 'unit_price': 2.35, 'amount': 999}],
+            'subtotal': 7.05, 'tax_amount': 0.71, 'total': 7.76, 'payment_date': None, 'payment_info': None,
+            'notes': 'kept'}
+    invoice = Invoice.from_dict(data)
+    assert invoice.items[0].amount == 705
+    out = invoice.to_dict()
+    assert out['items'][0]['amount'] == 7.05
+    assert out['total'] == 7.76
+    assert out['notes'] == 'kept'
+
+
+def test_parse_items_accepts_numbers_and_numeric_strings():
+    items, error = parse_items([{'description': 'a', 'quantity': 2, 'unit_price': '1.50'},
+                                {'description': 'b', 'quantity': 1.5, 'unit_price': 3}])
+    assert error is None
+    assert [item.amount for item in items] == [300, 450]
+
+
+@pytest.mark.parametrize('item', [
+    {'quantity': 1, 'unit_price': None},
+    {'quantity': None, 'unit_price': 1},
+    {'quantity': 1},
+    {'unit_price': 1},
+    {'quantity': True, 'unit_price': 1},
+    {'quantity': 1, 'unit_price': False},
+    {'quantity': float('nan'), 'unit_price': 1},
+    {'quantity': 1, 'unit_price': float('nan')},
+    {'quantity': 1, 'unit_price': 'abc'},
+    {'quantity': 'two', 'unit_price': 1},
+    'not an item',
+])
+def test_parse_items_rejects_invalid_items(item):
+    items, error = parse_items([item])
+    assert items is None
+    assert error
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+from utils.responses import collection_response
+
+SECOND = 1_000_000_000
+
+
+@pytest.fixture
+def collection():
+    state = {'version': 'v1', 'mtime_ns': time.time_ns()}
+    app = Flask(__name__)
+
+    @app.route('/items')
+    def items():
+        return collection_response('items', state['version'], state['mtime_ns'],
+                                   lambda pretty: f'["{state["version"]}"]'.encode())
+
+    state['client'] = app.test_client()
+    return state
+
+
+def test_change_within_the_same_second_is_not_a_304(collection):
+    first = collection['client'].get('/items')
+    # The list is changed again before its mtime's second is over
+    collection['version'] = 'v2'
+    collection['mtime_ns'] = time.time_ns()
+    since = first.headers.get('Last-Modified') or http_date(collection['mtime_ns'] // SECOND)
+
+    response = collection['client'].get('/items', headers={'If-Modified-Since': since})
+    assert response.status_code == 200
+    assert response.get_json() == ['v2']
+
+
+def test_unchanged_list_is_a_304_by_date_once_its_second_is_over(collection):
+    collection['mtime_ns'] = time.time_ns() - 5 * SECOND
+    first = collection['client'].get('/items')
+    assert first.headers['Last-Modified'] == http_date(collection['mtime_ns'] // SECOND)
+
+    response = collection['client'].get('/items', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+
+    collection['version'] = 'v2'
+    collection['mtime_ns'] = time.time_ns()
+    response = collection['client'].get('/items', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
+
+
+def test_etag_revalidation(collection):
+    first = collection['client'].get('/items')
+    response = collection['client'].get('/items', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+
+    collection['version'] = 'v2'
+    response = collection['client'].get('/items', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
@@ -0,0 +1,201 @@
+import math
+import os
+import threading
+import time
+
+from flask import g, jsonify, request
+from flask_login import current_user
+
+# Per-client rate buckets kept per route class before idle ones are dropped
+MAX_BUCKETS = 10000
+
+# Request threads per worker kept out of reach of the limited route classes,
+# so CRUD and login still get served while every slot and queue is taken
+MIN_FREE_THREADS = 2
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteClass:
+    """Admission control for a group of expensive routes.
+
+    At most ``max_concurrent`` requests run at once (per worker process);
+    up to ``max_queued`` more wait for a slot for at most ``queue_timeout``
+    seconds, and anything beyond that is turned away straight away. With
+    ``rate`` set, each user (or client address) also gets a token bucket
+    of ``burst`` requests refilled at ``rate`` per second.
+    """
+
+    def __init__(self, name, max_concurrent, max_queued=0, queue_timeout=10.0, rate=None, burst=None,
+                 retry_after=1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst if burst is not None else (max(1, rate) if rate else None)
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.counters = {'admitted': 0, 'queued': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0,
+                         'rejected_rate': 0}
+        self._buckets = {}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name, **defaults):
+        """Build with defaults, overridden by ADMISSION_<NAME>, e.g. "max_concurrent=4,rate=0.5"."""
+        settings = dict(defaults)
+        for item in os.getenv(f'ADMISSION_{name.upper()}', '').split(','):
+            if '=' not in item:
+                continue
+            key, value = (part.strip() for part in item.split('=', 1))
+            if key in ('max_concurrent', 'max_queued'):
+                settings[key] = int(value)
+            elif key in ('queue_timeout', 'rate', 'burst', 'retry_after'):
+                settings[key] = float(value) if value.lower() != 'none' else None
+            else:
+                print(f"Ignoring unknown admission setting for {name}: {key}")
+        return cls(name, **settings)
+
+    def acquire(self, client):
+        """Take a slot, waiting in the queue if need be; raises Rejected if it can't."""
+        with self._cond:
+            wait = self._take_token(client)
+            if wait:
+                self.counters['rejected_rate'] += 1
+                raise Rejected('rate limited', wait)
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queued:
+                    self.counters['rejected_queue_full'] += 1
+                    raise Rejected('queue full', self.retry_after)
+                self.waiting += 1
+                self.counters['queued'] += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters['rejected_timeout'] += 1
+                            raise Rejected('timed out waiting for a slot', self.retry_after)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.counters['admitted'] += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def _take_token(self, client):
+        """Spend one of client's tokens; returns 0, or the seconds until one is available."""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[client] = (tokens - 1, now)
+        if len(self._buckets) > MAX_BUCKETS:
+            self._prune(now)
+        return 0
+
+    def _prune(self, now):
+        # A bucket that would be full again is the same as no bucket
+        full_after = self.burst / self.rate
+        for client, (tokens, updated) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[client]
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queued': self.max_queued,
+                'queue_timeout': self.queue_timeout,
+                'rate': self.rate,
+                'burst': self.burst,
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'peak_queue_depth': self.peak_waiting,
+                **self.counters
+            }
+
+
+_route_classes = {}
+
+
+def client_key():
+    if current_user.is_authenticated:
+        return f'user:{current_user.get_id()}'
+    return f'ip:{request.remote_addr}'
+
+
+def limit(blueprint, route_class):
+    """Put every route of blueprint under route_class's admission control."""
+    _route_classes[route_class.name] = route_class
+
+    @blueprint.before_request
+    def admit():
+        # CORS preflights are cheap and carry no credentials
+        if request.method == 'OPTIONS':
+            return None
+        try:
+            route_class.acquire(client_key())
+        except Rejected as e:
+            response = jsonify({'error': 'Too many requests, try again later', 'reason': e.reason})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+            return response
+        g.admission = route_class
+        return None
+
+    @blueprint.teardown_request
+    def release(exc):
+        admitted = g.pop('admission', None)
+        if admitted is not None:
+            admitted.release()
+
+
+def fit_threads(threads):
+    """Shrink the route classes' queues, then their slots, until running and
+    queued requests together leave MIN_FREE_THREADS of threads for the rest.
+
+    A queued request waits on one of the server's request threads, so limits
+    adding up to more than the pool would let a report storm starve CRUD.
+    """
+    budget = max(threads - MIN_FREE_THREADS, len(_route_classes))
+    classes = list(_route_classes.values())
+
+    def held():
+        return sum(rc.max_concurrent + rc.max_queued for rc in classes)
+
+    if held() <= budget:
+        return
+    before = held()
+    for field, floor in (('max_queued', 0), ('max_concurrent', 1)):
+        while held() > budget:
+            rc = max(classes, key=lambda rc: getattr(rc, field))
+            if getattr(rc, field) <= floor:
+                break
+            setattr(rc, field, getattr(rc, field) - 1)
+    print(f"Admission limits hold up to {before} of {threads} request threads; reduced to "
+          + ', '.join(f'{rc.name} {rc.max_concurrent}+{rc.max_queued}' for rc in classes))
+    if held() > threads - MIN_FREE_THREADS:
+        print(f"Warning: {threads} threads is too few to keep {MIN_FREE_THREADS} free; raise --threads")
+
+
+def stats():
+    """Slots, queue depth and rejection counters for each route class in this worker."""
+    return {'pid': os.getpid(), 'route_classes': {name: rc.stats() for name, rc in _route_classes.items()}}
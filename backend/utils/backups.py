@@ -0,0 +1,254 @@
+import hashlib
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from utils import codec
+from utils.invoice_store import replay_log
+from utils.locks import FileLock
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+BACKUP_DIR = os.getenv('BACKUP_DIR', os.path.join(DATA_DIR, 'backups'))
+
+# A chunk ends after a record whose CRC has these low bits all zero, so
+# chunks average 16 records and their boundaries depend only on content:
+# inserting or deleting a record changes one chunk, not everything after it.
+CHUNK_MASK = (1 << 4) - 1
+MAX_CHUNK_RECORDS = 1024
+MAX_CHUNK_BYTES = 1 << 20
+
+COMPRESS_LEVEL = 6
+
+# An append-only log is only continued from the previous backup if its first
+# bytes and those just before where that backup stopped still hash the same;
+# the log id alone isn't enough, as a rewritten file can reuse the inode number
+LOG_CHECK_BYTES = 4096
+
+
+class BackupStore:
+    """Incremental backups as content-addressed chunks plus one manifest per backup.
+
+    Each data file is cut into chunks of whole records, stored once under
+    ``objects/`` by the sha256 of their contents. A manifest in
+    ``manifests/<id>.json`` lists the chunks making up every file at the
+    time of the backup, so each backup only writes the chunks that changed
+    since earlier ones, yet any backup restores the complete state.
+
+    Append-only files (the invoice store's data file) are backed up as a
+    log instead: as long as the file hasn't been rewritten, a backup only
+    reads and stores the lines appended since the previous one, and restoring
+    replays the log.
+    """
+
+    def __init__(self, root=BACKUP_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.manifests_dir = os.path.join(root, 'manifests')
+        self.lock = FileLock(os.path.join(root, '.lock'))
+
+    # Backing up
+
+    def create(self, sources, job=None):
+        """Back up sources: (name, version, records) tuples, where records()
+        yields each record as JSON bytes. A file whose version matches the
+        latest backup is carried over without reading it.
+
+        An append-only file can add a fourth item, the (log id, view, end)
+        of InvoiceStore.log_view(), to be backed up as a log.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.manifests_dir, exist_ok=True)
+            previous = self.latest()
+            previous_files = previous['files'] if previous else {}
+            known = {chunk for entry in previous_files.values() for chunk in entry['chunks']}
+
+            files = {}
+            stats = {'chunks': 0, 'new_chunks': 0, 'bytes': 0, 'new_bytes': 0, 'unchanged_files': 0}
+            for i, (name, version, records, *log) in enumerate(sources):
+                if job:
+                    job.set_progress(i / len(sources), f'Backing up {name}')
+                entry = previous_files.get(name)
+                if entry is not None and version is not None and entry['version'] == version:
+                    stats['unchanged_files'] += 1
+                elif log:
+                    entry = self._backup_log(entry, version, *log[0], known, stats)
+                else:
+                    entry = self._backup_file(version, records(), known, stats)
+                files[name] = entry
+                stats['chunks'] += len(entry['chunks'])
+                stats['bytes'] += entry['bytes']
+
+            now = datetime.now()
+            manifest = {
+                'id': self._new_id(now),
+                'created_at': now.isoformat(),
+                'parent': previous['id'] if previous else None,
+                'files': files,
+                'stats': stats
+            }
+            stats['seconds'] = round(time.perf_counter() - started, 3)
+            tmp_path = os.path.join(self.manifests_dir, f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            codec.dump_file(manifest, tmp_path)
+            os.replace(tmp_path, self._manifest_path(manifest['id']))
+        print(f"Backup {manifest['id']}: {stats['new_chunks']} new of {stats['chunks']} chunks, "
+              f"{stats['new_bytes']} bytes written in {stats['seconds']}s")
+        return manifest
+
+    def _backup_file(self, version, records, known, stats):
+        chunks = []
+        count = 0
+        size = 0
+        lines = []
+        chunk_bytes = 0
+        for raw in records:
+            lines.append(raw + b'\n')
+            chunk_bytes += len(raw) + 1
+            count += 1
+            if (zlib.crc32(raw) & CHUNK_MASK == 0 or len(lines) >= MAX_CHUNK_RECORDS
+                    or chunk_bytes >= MAX_CHUNK_BYTES):
+                chunks.append(self._put_chunk(b''.join(lines), known, stats))
+                size += chunk_bytes
+                lines = []
+                chunk_bytes = 0
+        if lines:
+            chunks.append(self._put_chunk(b''.join(lines), known, stats))
+            size += chunk_bytes
+        return {'version': version, 'records': count, 'bytes': size, 'chunks': chunks}
+
+    def _backup_log(self, previous, version, log_id, view, end, known, stats):
+        start = 0
+        chunks = []
+        count = size = 0
+        previous_log = previous.get('log') if previous else None
+        if (previous_log and previous_log['id'] == log_id and previous_log['end'] <= end
+                and _log_check(view, previous_log['end']) == previous_log['check']):
+            # Same file, only appended to: keep its chunks and add the new lines
+            start = previous_log['end']
+            chunks = list(previous['chunks'])
+            count = previous['records']
+            size = previous['bytes']
+        entry = self._backup_file(version, _log_lines(view, start, end), known, stats)
+        entry['chunks'] = chunks + entry['chunks']
+        entry['records'] += count
+        entry['bytes'] += size
+        entry['log'] = {'id': log_id, 'end': end, 'check': _log_check(view, end)}
+        return entry
+
+    def _put_chunk(self, data, known, stats):
+        chunk_id = hashlib.sha256(data).hexdigest()
+        if chunk_id in known:
+            return chunk_id
+        path = self._object_path(chunk_id)
+        if not os.path.exists(path):
+            compressed = zlib.compress(data, COMPRESS_LEVEL)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            stats['new_chunks'] += 1
+            stats['new_bytes'] += len(compressed)
+        known.add(chunk_id)
+        return chunk_id
+
+    def _new_id(self, now):
+        base = backup_id = now.strftime('%Y%m%d-%H%M%S-%f')
+        # Same-microsecond ids get a fixed-width counter: "<base>-01" sorts after
+        # "<base>" and before the next microsecond, keeping name order creation order
+        n = 0
+        while os.path.exists(self._manifest_path(backup_id)):
+            n += 1
+            backup_id = f'{base}-{n:02d}'
+        return backup_id
+
+    # Manifests
+
+    def _manifest_path(self, backup_id):
+        return os.path.join(self.manifests_dir, f'{backup_id}.json')
+
+    def _object_path(self, chunk_id):
+        return os.path.join(self.objects_dir, chunk_id[:2], chunk_id)
+
+    def ids(self):
+        try:
+            names = os.listdir(self.manifests_dir)
+        except FileNotFoundError:
+            return []
+        # Ids are timestamps, so name order is creation order
+        return sorted(name[:-5] for name in names if name.endswith('.json') and not name.startswith('.'))
+
+    def get(self, backup_id):
+        # Ids are generated from timestamps; anything else can't name a manifest
+        if not backup_id.replace('-', '').isdigit():
+            return None
+        try:
+            return codec.load_file(self._manifest_path(backup_id))
+        except FileNotFoundError:
+            return None
+
+    def list(self):
+        return [manifest for manifest in (self.get(backup_id) for backup_id in self.ids()) if manifest]
+
+    def latest(self):
+        ids = self.ids()
+        return self.get(ids[-1]) if ids else None
+
+    def find(self, at):
+        """The latest backup taken at or before the datetime at, or None."""
+        found = None
+        for manifest in self.list():
+            if datetime.fromisoformat(manifest['created_at']) > at:
+                break
+            found = manifest
+        return found
+
+    # Restoring
+
+    def iter_raw(self, manifest, name):
+        """Yield the JSON bytes of each record of name as of the backup."""
+        for chunk_id in manifest['files'][name]['chunks']:
+            with open(self._object_path(chunk_id), 'rb') as f:
+                data = zlib.decompress(f.read())
+            if hashlib.sha256(data).hexdigest() != chunk_id:
+                raise ValueError(f'Backup chunk {chunk_id} is corrupt')
+            yield from data.split(b'\n')[:-1]
+
+    def read_file(self, manifest, name):
+        if manifest['files'][name].get('log'):
+            return replay_log(self.iter_raw(manifest, name))
+        return [codec.loads(raw) for raw in self.iter_raw(manifest, name)]
+
+
+def _log_lines(view, start, end):
+    """Yield each line of view between offsets start and end."""
+    pos = start
+    while pos < end:
+        newline = view.find(b'\n', pos, end)
+        if newline == -1:
+            newline = end
+        if newline > pos:
+            yield view[pos:newline]
+        pos = newline + 1
+
+
+def _log_check(view, end):
+    return hashlib.sha256(view[:min(end, LOG_CHECK_BYTES)] + view[max(0, end - LOG_CHECK_BYTES):end]).hexdigest()
+
+
+def summary(manifest):
+    """A manifest without its chunk lists, for API responses."""
+    return {
+        'id': manifest['id'],
+        'created_at': manifest['created_at'],
+        'parent': manifest['parent'],
+        'files': {name: {'records': entry['records'], 'bytes': entry['bytes'], 'chunks': len(entry['chunks'])}
+                  for name, entry in manifest['files'].items()},
+        'stats': manifest['stats']
+    }
+
+
+backup_store = BackupStore()
@@ -0,0 +1,93 @@
+import dataclasses
+import decimal
+import json
+import os
+from datetime import date
+
+from flask import request, has_request_context
+from flask.json.provider import JSONProvider
+
+# orjson is optional; without it we fall back to a tuned stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson else 'json'
+
+# orjson's decode error subclasses this one, so callers can catch a single type
+JSONDecodeError = json.JSONDecodeError
+
+# Data files are written compact; set DATA_PRETTY_FILES=1 to keep them readable
+PRETTY_FILES = os.getenv('DATA_PRETTY_FILES', '').lower() in ('1', 'true', 'yes')
+
+
+def _default(o):
+    # Types json can't handle natively; orjson covers dates and dataclasses itself
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+_compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+_pretty_encoder = json.JSONEncoder(ensure_ascii=False, indent=2, default=_default)
+_decoder = json.JSONDecoder()
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def dumps(obj, pretty=False):
+    """Serialize obj to UTF-8 JSON bytes, compact unless pretty is set."""
+    if orjson is not None:
+        option = _ORJSON_OPTIONS | orjson.OPT_INDENT_2 if pretty else _ORJSON_OPTIONS
+        return orjson.dumps(obj, default=_default, option=option)
+    encoder = _pretty_encoder if pretty else _compact_encoder
+    return encoder.encode(obj).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode('utf-8')
+    return _decoder.decode(data)
+
+
+def load_file(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(obj, path, pretty=None):
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, PRETTY_FILES if pretty is None else pretty))
+
+
+def wants_pretty():
+    """Responses are compact unless the client asks with ?pretty=1."""
+    return has_request_context() and request.args.get('pretty', '').lower() in ('1', 'true', 'yes')
+
+
+class CodecJSONProvider(JSONProvider):
+    """Flask JSON provider backed by the codec, so ``jsonify`` and
+    ``request.get_json`` in every blueprint go through the same fast path.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, pretty=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, wants_pretty()), mimetype=self.mimetype)
+
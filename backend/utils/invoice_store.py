@@ -0,0 +1,476 @@
+import mmap
+import os
+import threading
+from collections import defaultdict
+
+from utils import codec
+from utils.locks import FileLock
+
+# Invoice fields that get a secondary index (field -> value -> set of invoice ids)
+INDEXED_FIELDS = ('status', 'customer_id')
+
+# Rewrite the data file once superseded versions outweigh live records (and are worth the I/O)
+COMPACT_MIN_DEAD_BYTES = 1 << 20
+
+# Streamed list responses are sent in chunks of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class InvoiceStore:
+    """Invoices stored as one compact JSON record per line.
+
+    Every create, update or delete appends a line to ``<path>`` (deletes
+    append a ``{"id": ..., "_deleted": true}`` tombstone) and an entry to the
+    sidecar ``<path>.idx``: ``[id, offset, length, status, customer_id]``,
+    or just ``[id, offset, length]`` for a delete. The sidecar maps each id
+    to its latest version and carries the secondary indexes, so opening the
+    store never parses invoice bodies. Records are decoded one at a time from
+    an mmap of the data file, keeping memory proportional to the number of
+    invoices rather than the size of the file.
+
+    The data file is authoritative: a missing, truncated or mismatched
+    sidecar is rebuilt (or caught up) by scanning the data file.
+
+    ``lock`` guards this process's view; ``write_lock`` extends it to an
+    flock on ``<path>.lock`` and is held for anything that writes either
+    file, so worker processes can share the store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = f'{path}.idx'
+        self.lock = threading.RLock()
+        self.write_lock = FileLock(f'{path}.lock', self.lock)
+        self._file_id = None
+        self._mmap = None
+        self.mtime_ns = None
+        self._reset()
+
+    def _reset(self):
+        self.offsets = {}
+        self.fields = {}
+        self.indexes = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        self.end = 0
+        self.dead_bytes = 0
+        self.max_id = 0
+
+    # Loading
+
+    def open(self):
+        with self.lock:
+            self._sync()
+        return self
+
+    def _sync(self):
+        """Pick up changes made by other processes (or a previous crash)."""
+        try:
+            st = os.stat(self.path)
+            if (st.st_dev, st.st_ino) == self._file_id and st.st_size == self.end:
+                self.mtime_ns = st.st_mtime_ns
+                return
+        except FileNotFoundError:
+            pass
+        # Catching up may repair the sidecar, so only one process does it at a time
+        with self.write_lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._create()
+                st = os.stat(self.path)
+            if (st.st_dev, st.st_ino) != self._file_id:
+                self._load(st)
+            elif st.st_size > self.end:
+                self._index_missing(self._scan(self.end, st.st_size))
+            elif st.st_size < self.end:
+                self._rebuild(st)
+            self.mtime_ns = st.st_mtime_ns
+
+    def _create(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        legacy_path = os.path.splitext(self.path)[0] + '.json'
+        if os.path.exists(legacy_path):
+            print(f"Migrating {legacy_path} to {self.path}")
+            records = codec.load_file(legacy_path)
+            self._write_all(records if isinstance(records, list) else [])
+        else:
+            self._write_all([])
+
+    def _load(self, st):
+        self._reset()
+        self._file_id = (st.st_dev, st.st_ino)
+        self._mmap = None
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            entries = codec.loads(b'[' + data.rstrip(b'\n').replace(b'\n', b',') + b']') if data else []
+        except (FileNotFoundError, codec.JSONDecodeError):
+            entries = None
+        if entries is None or not self._entries_match(entries, st.st_size):
+            return self._rebuild(st)
+        for entry in entries:
+            self._apply(entry)
+        if st.st_size > self.end:
+            self._index_missing(self._scan(self.end, st.st_size))
+
+    def _entries_match(self, entries, size):
+        # The last entry must point at a line that exists and holds that id
+        if not entries:
+            return True
+        invoice_id, offset, length = entries[-1][:3]
+        if offset + length + 1 > size:
+            return False
+        view = self._view(offset + length + 1)
+        try:
+            return codec.loads(view[offset:offset + length]).get('id') == invoice_id
+        except (codec.JSONDecodeError, AttributeError):
+            return False
+
+    def _rebuild(self, st):
+        print(f"Rebuilding invoice index {self.index_path}")
+        self._reset()
+        self._file_id = (st.st_dev, st.st_ino)
+        self._mmap = None
+        with open(self.index_path, 'wb'):
+            pass
+        self._index_missing(self._scan(0, st.st_size))
+
+    def _scan(self, start, size):
+        """Index the complete lines between start and size; returns their entries."""
+        view = self._view(size)
+        entries = []
+        pos = start
+        while pos < size:
+            newline = view.find(b'\n', pos, size)
+            if newline == -1:
+                # Half-written last line; leave it for the next sync
+                break
+            if newline > pos:
+                try:
+                    record = codec.loads(view[pos:newline])
+                    entries.append(self._entry(record, pos, newline - pos))
+                except (codec.JSONDecodeError, AttributeError, KeyError, TypeError):
+                    # e.g. the remains of a line cut short by a crash
+                    print(f"Skipping unreadable line at offset {pos} of {self.path}")
+                    self.dead_bytes += newline - pos + 1
+            pos = newline + 1
+        for entry in entries:
+            self._apply(entry)
+        self.end = max(self.end, pos)
+        return entries
+
+    def _index_missing(self, entries):
+        """Append the entries the sidecar doesn't have yet.
+
+        Whoever appends a line also writes its entry, so lines picked up from
+        other processes are normally indexed already; only lines past the
+        sidecar's last entry (left by a crash between the two writes) are
+        missing. Call with write_lock held.
+        """
+        indexed_end = self._indexed_end()
+        if indexed_end is None:
+            # Unreadable sidecar; the next load rebuilds it
+            return
+        missing = [entry for entry in entries if entry[1] >= indexed_end]
+        if missing:
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(codec.dumps(entry) + b'\n' for entry in missing))
+
+    def _indexed_end(self):
+        """Where the line of the sidecar's last entry ends in the data file (0 if empty), or None."""
+        try:
+            with open(self.index_path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - 4096))
+                tail = f.read()
+        except FileNotFoundError:
+            return 0
+        last = tail.rstrip(b'\n').rsplit(b'\n', 1)[-1]
+        if not last:
+            return 0
+        try:
+            entry = codec.loads(last)
+            return entry[1] + entry[2] + 1
+        except (codec.JSONDecodeError, IndexError, KeyError, TypeError):
+            return None
+
+    # Index maintenance
+
+    @staticmethod
+    def _entry(record, offset, length):
+        if record.get('_deleted'):
+            return [record['id'], offset, length]
+        return [record['id'], offset, length] + [record.get(field) for field in INDEXED_FIELDS]
+
+    def _apply(self, entry):
+        invoice_id, offset, length = entry[:3]
+        # Deleted ids count too: an invoice number is never issued twice
+        if str(invoice_id).isdigit():
+            self.max_id = max(self.max_id, int(invoice_id))
+        # Updates keep their slot in self.offsets, so listing order stays creation order
+        previous = self.offsets.get(invoice_id)
+        if previous is not None:
+            self.dead_bytes += previous[1] + 1
+            for field, value in zip(INDEXED_FIELDS, self.fields.pop(invoice_id)):
+                ids = self.indexes[field].get(value)
+                if ids is not None:
+                    ids.discard(invoice_id)
+                    if not ids:
+                        del self.indexes[field][value]
+        if len(entry) == 3:
+            # Tombstone: the line itself is dead weight
+            self.offsets.pop(invoice_id, None)
+            self.dead_bytes += length + 1
+        else:
+            values = tuple(entry[3:])
+            self.offsets[invoice_id] = (offset, length)
+            self.fields[invoice_id] = values
+            for field, value in zip(INDEXED_FIELDS, values):
+                self.indexes[field][value].add(invoice_id)
+        self.end = max(self.end, offset + length + 1)
+
+    # Reading
+
+    def _view(self, size=None):
+        """mmap of the data file covering at least size bytes (default: self.end)."""
+        size = self.end if size is None else size
+        if self._mmap is None or len(self._mmap) < size:
+            if size == 0:
+                return b''
+            with open(self.path, 'rb') as f:
+                # Older maps are left to the GC so in-flight readers keep working
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def get_raw(self, invoice_id):
+        with self.lock:
+            self._sync()
+            location = self.offsets.get(invoice_id)
+            if location is None:
+                return None
+            view = self._view()
+        offset, length = location
+        return view[offset:offset + length]
+
+    def get(self, invoice_id):
+        raw = self.get_raw(invoice_id)
+        return codec.loads(raw) if raw is not None else None
+
+    def _locations(self, ids=None):
+        with self.lock:
+            self._sync()
+            if ids is None:
+                locations = list(self.offsets.values())
+            else:
+                locations = [self.offsets[i] for i in sorted(ids, key=_id_order) if i in self.offsets]
+            return locations, self._view()
+
+    def iter_raw(self, ids=None):
+        """Yield the stored JSON bytes of each invoice, in creation order."""
+        locations, view = self._locations(ids)
+        for offset, length in locations:
+            yield view[offset:offset + length]
+
+    def iter_records(self, ids=None):
+        for raw in self.iter_raw(ids):
+            yield codec.loads(raw)
+
+    def iter_json_array(self, ids=None):
+        """Yield a JSON array of the invoices in chunks, without decoding them."""
+        chunk = [b'[']
+        size = 1
+        first = True
+        for raw in self.iter_raw(ids):
+            if not first:
+                chunk.append(b',')
+            chunk.append(raw)
+            first = False
+            size += len(raw) + 1
+            if size >= STREAM_CHUNK_BYTES:
+                yield b''.join(chunk)
+                chunk, size = [], 0
+        chunk.append(b']')
+        yield b''.join(chunk)
+
+    def find(self, field, *values):
+        """Return the invoices whose indexed field matches any of values."""
+        with self.lock:
+            self._sync()
+            ids = set()
+            for value in values:
+                ids |= self.indexes[field].get(value, set())
+        return list(self.iter_records(ids))
+
+    def with_status(self, *statuses):
+        return self.find('status', *statuses)
+
+    def for_customer(self, customer_id):
+        return self.find('customer_id', customer_id)
+
+    def version_info(self):
+        """(version, mtime_ns) of the stored invoices; the version changes whenever they do."""
+        with self.lock:
+            self._sync()
+            return f'{self._file_id[1]:x}-{self.end:x}-{self.mtime_ns:x}', self.mtime_ns
+
+    def log_view(self):
+        """(log id, view, end) for backing up the data file as an append-only log.
+
+        view[:end] holds every line written since the file was created,
+        superseded versions and tombstones included. The log id changes when
+        the file is rewritten (compaction, restore), so while it stays the
+        same, a later view only has more lines after end.
+        """
+        with self.lock:
+            self._sync()
+            return f'{self._file_id[0]:x}-{self._file_id[1]:x}', self._view(), self.end
+
+    def live_bytes(self):
+        """Size of the current invoices as stored, about the size of the JSON list."""
+        with self.lock:
+            self._sync()
+            return self.end - self.dead_bytes
+
+    def count(self):
+        with self.lock:
+            self._sync()
+            return len(self.offsets)
+
+    def next_id(self):
+        with self.lock:
+            self._sync()
+            return str(self.max_id + 1)
+
+    # Writing
+
+    def _append(self, record):
+        self._sync()
+        line = codec.dumps(record)
+        with open(self.path, 'r+b') as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset > self.end:
+                # Synced under write_lock, so anything past self.end is a line a
+                # crashed writer didn't finish; writing after it would garble ours
+                print(f"Dropping {offset - self.end} bytes of half-written data from {self.path}")
+                f.truncate(self.end)
+                offset = f.seek(self.end)
+            f.write(line + b'\n')
+        entry = self._entry(record, offset, len(line))
+        with open(self.index_path, 'ab') as f:
+            f.write(codec.dumps(entry) + b'\n')
+        self._apply(entry)
+        self._maybe_compact()
+
+    def put(self, invoice):
+        """Store a new or updated invoice."""
+        with self.write_lock:
+            self._append(invoice)
+
+    def delete(self, invoice_id):
+        with self.write_lock:
+            self._sync()
+            if invoice_id not in self.offsets:
+                return False
+            self._append({'id': invoice_id, '_deleted': True})
+            return True
+
+    def replace_all(self, invoices):
+        """Replace every invoice, e.g. when restoring a backup."""
+        with self.write_lock:
+            self._write_all(invoices)
+            self._sync()
+
+    def _maybe_compact(self):
+        live_bytes = self.end - self.dead_bytes
+        if self.dead_bytes >= COMPACT_MIN_DEAD_BYTES and self.dead_bytes > live_bytes:
+            self._compact()
+            self._sync()
+
+    def _compact(self):
+        """Rewrite the data file with just the live lines, copying their bytes.
+
+        Lines and sidecar entries are streamed to the new files one at a
+        time, so memory stays flat however large the file is. Call with
+        write_lock held.
+        """
+        view = self._view()
+        offset = 0
+        max_id = 0
+        with open(f'{self.index_path}.tmp', 'wb') as index, open(f'{self.path}.tmp', 'wb') as data:
+            for invoice_id, (old_offset, length) in self.offsets.items():
+                if str(invoice_id).isdigit():
+                    max_id = max(max_id, int(invoice_id))
+                data.write(view[old_offset:old_offset + length + 1])
+                index.write(codec.dumps([invoice_id, offset, length, *self.fields[invoice_id]]) + b'\n')
+                offset += length + 1
+            if self.max_id > max_id:
+                # Keep the highest id ever issued, so next_id doesn't hand it out again
+                line = codec.dumps({'id': str(self.max_id), '_deleted': True})
+                data.write(line + b'\n')
+                index.write(codec.dumps([str(self.max_id), offset, len(line)]) + b'\n')
+        self._swap_in()
+
+    def _write_all(self, invoices):
+        """Write a fresh data file and sidecar from invoices, then swap both in."""
+        lines = []
+        entries = []
+        offset = 0
+        for invoice in invoices:
+            if not isinstance(invoice, dict) or 'id' not in invoice:
+                continue
+            line = codec.dumps(invoice)
+            lines.append(line + b'\n')
+            entries.append(codec.dumps(self._entry(invoice, offset, len(line))) + b'\n')
+            offset += len(line) + 1
+        with self.write_lock:
+            with open(f'{self.index_path}.tmp', 'wb') as f:
+                f.write(b''.join(entries))
+            with open(f'{self.path}.tmp', 'wb') as f:
+                f.write(b''.join(lines))
+            self._swap_in()
+
+    def _swap_in(self):
+        # Data first: a sidecar that doesn't match its data file gets rebuilt on load
+        os.replace(f'{self.path}.tmp', self.path)
+        os.replace(f'{self.index_path}.tmp', self.index_path)
+
+
+def replay_log(lines):
+    """The live invoices in data file lines, in listing order: later
+    versions replace earlier ones in place and tombstones remove them."""
+    invoices = {}
+    for raw in lines:
+        try:
+            record = codec.loads(raw)
+            invoice_id = record['id']
+        except (codec.JSONDecodeError, KeyError, TypeError):
+            continue
+        if record.get('_deleted'):
+            invoices.pop(invoice_id, None)
+        else:
+            invoices[invoice_id] = record
+    return list(invoices.values())
+
+
+def _id_order(invoice_id):
+    # Ids are generated as "1", "2", ... so keep numeric order
+    invoice_id = str(invoice_id)
+    return (0, int(invoice_id), '') if invoice_id.isdigit() else (1, 0, invoice_id)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_invoice_store(path):
+    """Return the shared store for an invoices file, one per absolute path."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        invoice_store = _stores.get(path)
+        if invoice_store is None:
+            invoice_store = _stores[path] = InvoiceStore(path)
+    return invoice_store
+
+
+def all_invoice_stores():
+    with _stores_lock:
+        return list(_stores.values())
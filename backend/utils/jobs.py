@@ -0,0 +1,287 @@
+import os
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from utils import codec
+
+# Heavy jobs that may run at the same time; the rest wait in the queue
+MAX_WORKERS = int(os.getenv('JOBS_MAX_WORKERS', '2'))
+# Jobs that may be waiting or running before new submissions are refused
+MAX_QUEUED = int(os.getenv('JOBS_MAX_QUEUED', '20'))
+# Finished jobs kept around so their status and results can still be fetched
+MAX_HISTORY = int(os.getenv('JOBS_MAX_HISTORY', '100'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobResult:
+    def __init__(self, data, mimetype='application/json', filename=None, path=None):
+        self._data = data
+        self.mimetype = mimetype
+        self.filename = filename
+        # Set once the data has been written out for other worker processes
+        self.path = path
+
+    @property
+    def data(self):
+        if self._data is None and self.path is not None:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        return self._data
+
+
+class Job:
+    def __init__(self, job_type, params, owner_id):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.params = params
+        self.owner_id = owner_id
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = None
+        self.error = None
+        self.result = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._cancel_file = None
+        self._publish = None
+        self.cancellable = True
+
+    @classmethod
+    def from_dict(cls, data, result_path=None):
+        """Read-only view of a job published by another worker process."""
+        job = cls(data['type'], None, data['owner_id'])
+        job.id = data['id']
+        for key in ('status', 'progress', 'message', 'error', 'created_at', 'started_at', 'finished_at'):
+            setattr(job, key, data[key])
+        result = data.get('result')
+        if result is not None:
+            job.result = JobResult(None, result['mimetype'], result['filename'], result_path)
+        return job
+
+    def set_progress(self, progress, message=None):
+        """Called by handlers; also the point where a cancel request lands."""
+        self.check_cancelled()
+        self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = message
+        if self._publish is not None:
+            self._publish(self)
+
+    def cancelled(self):
+        if self._cancel.is_set():
+            return True
+        # Cancel requests handled by another worker process arrive as a marker file
+        return self._cancel_file is not None and os.path.exists(self._cancel_file)
+
+    def check_cancelled(self):
+        if self.cancellable and self.cancelled():
+            raise JobCancelled()
+
+    def prevent_cancel(self):
+        """From here on the job runs to completion, e.g. once it has started writing data."""
+        self.check_cancelled()
+        self.cancellable = False
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'has_result': self.result is not None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """Runs registered job handlers on a small bounded thread pool.
+
+    Handlers are plain functions ``handler(job, params)`` returning a
+    ``JobResult`` (or None). They report progress with ``job.set_progress``,
+    which raises ``JobCancelled`` once the job has been cancelled.
+
+    Jobs run in the process that accepted them. After ``share(directory)``
+    their state and results are also published there, so any worker
+    process can report on, cancel or serve the result of any job.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED, max_history=MAX_HISTORY):
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.shared_dir = None
+        self.handlers = {}
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def register(self, job_type, handler):
+        self.handlers[job_type] = handler
+
+    def share(self, shared_dir):
+        os.makedirs(shared_dir, exist_ok=True)
+        self.shared_dir = shared_dir
+
+    def submit(self, job_type, params, owner_id, app=None):
+        if job_type not in self.handlers:
+            raise KeyError(job_type)
+        job = Job(job_type, params, owner_id)
+        if self.shared_dir is not None:
+            job._cancel_file = self._shared_path(job.id, '.cancel')
+            job._publish = self._publish
+        with self._lock:
+            active = sum(1 for j in self.jobs.values() if j.status not in FINISHED_STATES)
+            if active >= self.max_queued:
+                raise QueueFull()
+            self.jobs[job.id] = job
+            self._prune()
+            self._publish(job)
+        self._executor.submit(self._run, job, app)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            job = self._load_shared(job_id)
+        return job
+
+    def list(self, owner_id):
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job.owner_id == owner_id]
+        if self.shared_dir is not None:
+            local_ids = {job.id for job in jobs}
+            for name in os.listdir(self.shared_dir):
+                job_id, ext = os.path.splitext(name)
+                if ext != '.json' or job_id in local_ids:
+                    continue
+                job = self._load_shared(job_id)
+                if job is not None and job.owner_id == owner_id:
+                    jobs.append(job)
+            jobs.sort(key=lambda job: job.created_at)
+        return jobs
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            job = self._load_shared(job_id)
+            if job is not None and job.status not in FINISHED_STATES:
+                # Owned by another worker process, which picks this up
+                open(self._shared_path(job_id, '.cancel'), 'wb').close()
+            return job
+        job._cancel.set()
+        with self._lock:
+            # A queued job never starts; a running one stops at its next progress report
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def _run(self, job, app):
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            if job.cancelled():
+                self._finish(job, CANCELLED)
+                return
+            job.status = RUNNING
+            job.started_at = datetime.now().isoformat()
+            self._publish(job)
+        try:
+            handler = self.handlers[job.type]
+            if app is not None:
+                with app.app_context():
+                    result = handler(job, job.params)
+            else:
+                result = handler(job, job.params)
+            job.check_cancelled()
+            job.result = self._store_result(job, result)
+            job.progress = 1.0
+            status = SUCCEEDED
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            print(f"Error in job {job.id} ({job.type}): {str(e)}")
+            print(f"Traceback: {traceback.format_exc()}")
+            job.error = str(e)
+            status = FAILED
+        with self._lock:
+            self._finish(job, status)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = datetime.now().isoformat()
+        # Params can hold uploaded files; no need to keep them once done
+        job.params = None
+        self._publish(job)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+            if self.shared_dir is not None:
+                for suffix in ('.json', '.result', '.cancel'):
+                    try:
+                        os.remove(self._shared_path(job_id, suffix))
+                    except FileNotFoundError:
+                        pass
+
+    # Sharing jobs between worker processes
+
+    def _shared_path(self, job_id, suffix):
+        return os.path.join(self.shared_dir, f'{job_id}{suffix}')
+
+    def _publish(self, job):
+        if self.shared_dir is None:
+            return
+        data = job.to_dict()
+        data['owner_id'] = job.owner_id
+        if job.result is not None:
+            data['result'] = {'mimetype': job.result.mimetype, 'filename': job.result.filename}
+        tmp_path = self._shared_path(job.id, f'.{os.getpid()}.tmp')
+        codec.dump_file(data, tmp_path)
+        os.replace(tmp_path, self._shared_path(job.id, '.json'))
+
+    def _store_result(self, job, result):
+        if self.shared_dir is None or result is None:
+            return result
+        path = self._shared_path(job.id, '.result')
+        with open(path, 'wb') as f:
+            f.write(result.data)
+        return JobResult(None, result.mimetype, result.filename, path)
+
+    def _load_shared(self, job_id):
+        # Job ids are uuid hex strings; anything else can't name a job file
+        if self.shared_dir is None or not job_id.isalnum():
+            return None
+        try:
+            data = codec.load_file(self._shared_path(job_id, '.json'))
+        except (FileNotFoundError, codec.JSONDecodeError):
+            return None
+        return Job.from_dict(data, self._shared_path(job_id, '.result'))
+
+
+job_manager = JobManager()
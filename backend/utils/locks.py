@@ -0,0 +1,55 @@
+import os
+import threading
+
+# fcntl is POSIX only; on Windows the app runs as a single process anyway
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Reentrant lock held across threads of this process and across processes.
+
+    Threads are serialized with an RLock; the outermost acquire also takes an
+    exclusive ``flock`` on ``path`` so worker processes started by serve.py
+    don't interleave their read-modify-write cycles on the same data file.
+    Pass an existing RLock as ``lock`` to make this its cross-process
+    extension, so code holding either one can't deadlock against the other.
+    """
+
+    def __init__(self, path, lock=None):
+        self.path = path
+        self._lock = lock if lock is not None else threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,149 @@
+import gzip
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from flask import current_app, request
+
+from utils import codec
+
+# Bodies smaller than this go out uncompressed; the saving isn't worth the CPU
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+
+# Collection bodies larger than this aren't cached: they are streamed where the
+# collection supports it (invoices) and encoded per request otherwise
+CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 << 20)))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/')
+
+
+def choose_encoding():
+    """The compression the client accepts, preferring gzip, or None."""
+    for encoding in ('gzip', 'deflate'):
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        # Fixed mtime so the same body always compresses to the same bytes
+        return gzip.compress(body, COMPRESS_LEVEL, mtime=0)
+    return zlib.compress(body, COMPRESS_LEVEL)
+
+
+class ResponseCache:
+    """Encoded response bodies for the current version of each collection.
+
+    Each key holds one version; asking for a newer version drops the
+    bodies cached for the old one.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, encoding, build):
+        """Return (body, encoding actually used) for version, calling build() on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                entry = self._entries[key] = (version, {})
+        bodies = entry[1]
+        identity = bodies.get(None)
+        if identity is None:
+            identity = build()
+        if encoding is None or len(identity) < COMPRESS_MIN_BYTES:
+            encoding = None
+            body = identity
+        else:
+            body = bodies.get(encoding)
+            if body is None:
+                body = compress(identity, encoding)
+        if len(identity) <= CACHE_MAX_BYTES:
+            bodies[None] = identity
+            bodies[encoding] = body
+        return body, encoding
+
+
+_cache = ResponseCache()
+
+
+def _not_modified(version, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(version)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks on the fly."""
+    # wbits 31 writes a gzip container, 15 a zlib one (HTTP's "deflate")
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def collection_response(key, version, mtime_ns, build, size=None, stream=None):
+    """JSON list response with validators, compressed and cached per collection version.
+
+    ``build(pretty)`` returns the uncompressed JSON bytes. Unchanged
+    collections get a 304 and repeat requests reuse the cached bytes, so
+    build is only called the first time a version is asked for.
+
+    Collections that can outgrow memory pass their approximate ``size`` and
+    a ``stream()`` yielding the JSON in chunks; above CACHE_MAX_BYTES the
+    body is streamed (and compressed as it goes) instead of built and cached.
+    """
+    # HTTP dates have whole seconds, so a change later in the same second would
+    # get the same date and a wrong 304: only send the date once its second is over
+    last_modified = None
+    if mtime_ns is not None and time.time_ns() // 1_000_000_000 > mtime_ns // 1_000_000_000:
+        last_modified = datetime.fromtimestamp(mtime_ns // 1_000_000_000, timezone.utc)
+
+    if _not_modified(version, last_modified):
+        response = current_app.response_class(status=304)
+    elif stream is not None and size is not None and size > CACHE_MAX_BYTES:
+        encoding = choose_encoding()
+        chunks = stream() if encoding is None else compress_stream(stream(), encoding)
+        response = current_app.response_class(chunks, mimetype='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+    else:
+        pretty = codec.wants_pretty()
+        body, encoding = _cache.get((key, pretty), version, choose_encoding(), lambda: build(pretty))
+        response = current_app.response_class(body, mimetype='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+
+    # Same version, same content: a weak ETag covers every encoding and ?pretty
+    response.set_etag(version, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Data is per user; clients may keep it but must revalidate each time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """after_request hook compressing any other large JSON or text response."""
+    if (response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_MIMETYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = choose_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,148 @@
+import gc
+import hashlib
+import marshal
+import os
+import threading
+import time
+
+from utils import store
+from utils.invoice_store import get_invoice_store
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+
+# Parsed collections in marshal format, so a fresh worker can skip JSON
+# parsing. Records are plain JSON types, which marshal handles natively and
+# loads without running any code. Invoices aren't included: their store keeps
+# its own on-disk index.
+SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', os.path.join(DATA_DIR, '.snapshot.marshal'))
+SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# Bump when the layout of the snapshot payload changes
+FORMAT_VERSION = 2
+
+_save_lock = threading.Lock()
+_save_thread = None
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_snapshot():
+    try:
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            snapshot = marshal.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {SNAPSHOT_FILE}: {str(e)}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != (FORMAT_VERSION, marshal.version):
+        return None
+    return snapshot
+
+
+def _entry_matches(entry, path):
+    """A snapshot entry is valid if the file is unchanged: same mtime and size,
+    or (e.g. after a deploy touched the file) the same content hash."""
+    stamp = store.file_stamp(path)
+    if stamp is None:
+        return False, None
+    if entry['stamp'] == stamp:
+        return True, stamp
+    if entry['stamp'][1] == stamp[1] and entry['sha256'] == file_hash(path):
+        return True, stamp
+    return False, stamp
+
+
+def load(collection_paths, invoice_paths=(), report=None):
+    """Warm the store from the snapshot where it is still valid, and open the invoice stores.
+
+    Returns True if anything had to be parsed from JSON, i.e. the snapshot
+    is out of date and worth saving again.
+    """
+    # Loading creates millions of small objects; the cyclic GC would otherwise
+    # rescan them over and over while they're being built
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load(collection_paths, invoice_paths, report)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+        # Keep the loaded data out of future collections
+        gc.freeze()
+
+
+def _load(collection_paths, invoice_paths, report):
+    started = time.perf_counter()
+    snapshot = _read_snapshot() if SNAPSHOT_ENABLED else None
+    if report:
+        report.record('read snapshot' if snapshot else 'read snapshot (missing)', time.perf_counter() - started)
+    entries = snapshot['collections'] if snapshot else {}
+    stale = snapshot is None
+
+    for path in dict.fromkeys(os.path.abspath(p) for p in collection_paths):
+        started = time.perf_counter()
+        collection = store.get_collection(path)
+        entry = entries.get(path)
+        valid, stamp = _entry_matches(entry, path) if entry else (False, None)
+        if valid:
+            collection.install(entry['records'], stamp)
+            source = 'snapshot'
+        else:
+            collection.refresh()
+            source = 'json'
+            stale = True
+        if report:
+            report.record(f'load {os.path.basename(path)} ({source})', time.perf_counter() - started)
+
+    for path in dict.fromkeys(os.path.abspath(p) for p in invoice_paths):
+        started = time.perf_counter()
+        get_invoice_store(path).open()
+        if report:
+            report.record(f'open {os.path.basename(path)}', time.perf_counter() - started)
+
+    return stale
+
+
+def save():
+    """Write the current collections to the snapshot file."""
+    if not SNAPSHOT_ENABLED:
+        return
+    with _save_lock:
+        collections = {}
+        for collection in store.all_collections():
+            with collection.lock:
+                records, stamp = collection.records, collection.stamp
+            if records is None or stamp is None:
+                continue
+            sha256 = file_hash(collection.path)
+            # Skip files that changed while hashing; they'll be parsed next start
+            if store.file_stamp(collection.path) != stamp:
+                continue
+            collections[collection.path] = {'stamp': stamp, 'sha256': sha256, 'records': records}
+
+        snapshot = {'format': (FORMAT_VERSION, marshal.version), 'collections': collections}
+        tmp_file = f'{SNAPSHOT_FILE}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(SNAPSHOT_FILE), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            f.write(marshal.dumps(snapshot))
+        os.replace(tmp_file, SNAPSHOT_FILE)
+
+
+def save_in_background():
+    """Refresh the snapshot off the startup path."""
+    global _save_thread
+    _save_thread = threading.Thread(target=save, daemon=True)
+    _save_thread.start()
+
+
+def wait():
+    """Wait for a background save, e.g. before forking workers."""
+    if _save_thread is not None:
+        _save_thread.join()
@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+
+# Taken as early as possible; app.py imports this module first
+PROCESS_START = time.perf_counter()
+
+
+class StartupReport:
+    """Collects how long each startup step (imports, data loading) took."""
+
+    def __init__(self):
+        self.steps = []
+        self.total_seconds = None
+
+    def record(self, name, seconds):
+        self.steps.append((name, seconds))
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def finish(self):
+        """Mark startup as done; the total is fixed from here on."""
+        self.total_seconds = time.perf_counter() - PROCESS_START
+
+    def to_dict(self):
+        total = self.total_seconds
+        if total is None:
+            # Still starting up
+            total = time.perf_counter() - PROCESS_START
+        return {
+            'total_ms': round(total * 1000, 1),
+            'steps': [{'name': name, 'ms': round(seconds * 1000, 1)} for name, seconds in self.steps]
+        }
+
+    def print_report(self):
+        report = self.to_dict()
+        print(f"Startup finished in {report['total_ms']} ms")
+        for step in report['steps']:
+            print(f"  {step['ms']:>8.1f} ms  {step['name']}")
+
+
+startup_report = StartupReport()
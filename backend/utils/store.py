@@ -0,0 +1,100 @@
+import os
+import threading
+
+from utils import codec
+from utils.locks import FileLock
+
+
+def file_stamp(path):
+    """(mtime_ns, size) of a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class Collection:
+    """Parsed contents of one JSON data file, reparsed only when the file changes.
+
+    Records returned by ``read`` are shared between requests and must be
+    treated as read-only; writers load their own copy with
+    ``codec.load_file`` and hand the result to ``write``, holding
+    ``write_lock`` (see ``locked``) so concurrent writers in this or another
+    worker process don't overwrite each other's changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = None
+        self.stamp = None
+        self.lock = threading.RLock()
+        self.write_lock = FileLock(f'{path}.lock')
+
+    @property
+    def version(self):
+        if self.stamp is None:
+            return '0'
+        return f'{self.stamp[0]:x}-{self.stamp[1]:x}'
+
+    def refresh(self):
+        with self.lock:
+            stamp = file_stamp(self.path)
+            if self.records is not None and stamp == self.stamp:
+                return
+            self.records = codec.load_file(self.path) if stamp is not None else []
+            self.stamp = stamp
+
+    def install(self, records, stamp):
+        """Use already-parsed records (e.g. from a snapshot) for the given file state."""
+        with self.lock:
+            self.records = records
+            self.stamp = stamp
+
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def get_collection(path):
+    path = os.path.abspath(path)
+    with _collections_lock:
+        collection = _collections.get(path)
+        if collection is None:
+            collection = _collections[path] = Collection(path)
+    return collection
+
+
+def all_collections():
+    with _collections_lock:
+        return list(_collections.values())
+
+
+def read(path):
+    collection = get_collection(path)
+    collection.refresh()
+    return collection.records
+
+
+def read_versioned(path):
+    """Like read, plus the collection version and file mtime those records belong to."""
+    collection = get_collection(path)
+    with collection.lock:
+        collection.refresh()
+        mtime_ns = collection.stamp[0] if collection.stamp is not None else None
+        return collection.records, collection.version, mtime_ns
+
+
+def locked(path):
+    """Lock guarding a load/modify/write cycle on path, across threads and processes."""
+    return get_collection(path).write_lock
+
+
+def write(path, records):
+    collection = get_collection(path)
+    with collection.write_lock, collection.lock:
+        # Swap the file in whole so other processes never read a half-written file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        codec.dump_file(records, tmp_path)
+        os.replace(tmp_path, path)
+        collection.install(records, file_stamp(path))